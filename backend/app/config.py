@@ -40,6 +40,7 @@ class Settings(BaseSettings):
     GROQ_API_KEY: str = ""
     GROQ_MODEL: str = "llama-3.1-8b-instant"
     GROQ_TIMEOUT: int = 30
+    GROQ_MAX_PROMPT_TOKENS: int = 6000  # System prompt + context + query
     
     # File Upload
     MAX_FILE_SIZE: int = 50 * 1024 * 1024  # 50MB
@@ -55,6 +56,7 @@ class Settings(BaseSettings):
     # Logging
     LOG_LEVEL: str = "INFO"
     LOG_FORMAT: str = "json"  # json or text
+    METRICS_SAMPLE_RATE: float = 1.0  # Fraction of successful requests persisted to metrics.db
     
     # Email Configuration (for Magic Links)
     SMTP_SERVER: str = "smtp.gmail.com"
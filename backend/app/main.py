@@ -103,6 +103,12 @@ app.include_router(share.router)
 app.include_router(admin.router)
 app.include_router(profile.router)
 
+@app.on_event("shutdown")
+async def close_llm_client():
+    """Close the pooled Groq HTTP client."""
+    from .rag.llm import aclose_client
+    await aclose_client()
+
 @app.get("/")
 def read_root():
     return {
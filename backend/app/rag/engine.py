@@ -5,13 +5,15 @@ import uuid
 from dataclasses import dataclass
 
 # Core Components
-from .indexer import get_collection, embedding_model
+from .indexer import get_collection, embed_query
 from .retrievers.reranker import reranker
 from .retrievers.hybrid import hybrid_retriever
 from .metrics import metrics
 # Phase H Components
 from .query_optimizer import query_optimizer
+from .production_pipeline import route_query
 from .cache_manager import cache_manager
+from .parent_store import parent_store
 
 logger = logging.getLogger(__name__)
 
@@ -48,6 +50,18 @@ class RAGEngine:
         """
         Execute full RAG retrieval pipeline with monitoring.
         """
+        return self.query_with_embedding(query_text, user_id, file_ids, n_results)[0]
+
+    def query_with_embedding(self, 
+             query_text: str, 
+             user_id: int, 
+             file_ids: Optional[List[int]] = None, 
+             n_results: int = 3) -> Tuple[List[Dict], Optional[tuple]]:
+        """
+        query(), plus the embedding vector search used (of the HyDE doc for
+        short queries), so the answer cache can reuse it instead of encoding
+        the question again. The embedding is None if retrieval failed.
+        """
         trace_id = str(uuid.uuid4())[:8]
         logger.info(f"[{trace_id}] Query Start: '{query_text}' (User: {user_id})")
         start_time = time.time()
@@ -55,7 +69,7 @@ class RAGEngine:
         try:
             # 1. Intent Classification & Importance
             importance_filter = self._analyze_importance(query_text)
-            intent = query_optimizer.classify_intent(query_text)
+            _, intent = route_query(query_text)
             logger.info(f"[{trace_id}] Intent Detected: {intent}")
             
             # --- PHASE H: Query Optimization ---
@@ -67,6 +81,9 @@ class RAGEngine:
                     logger.info(f"[{trace_id}] HyDE Expanded: {hyde_doc[:50]}...")
                     search_query = hyde_doc 
             # -----------------------------------
+            # Encoded once; the vector searches below re-embed the same text
+            # from embed_query's in-memory cache
+            query_embedding = embed_query(search_query)
             
             # 2. Strategy Selection
             final_candidates = []
@@ -114,11 +131,11 @@ class RAGEngine:
             # 6. Context Expansion (Parent-Child)
             expanded_docs = self._expand_context(final_docs)
             
-            return expanded_docs
+            return expanded_docs, query_embedding
             
         except Exception as e:
             logger.error(f"[{trace_id}] Query Failed: {e}", exc_info=True)
-            return []
+            return [], None
 
     def _analyze_importance(self, query: str) -> Optional[str]:
         """Determine if query targets a specific importance section."""
@@ -131,7 +148,7 @@ class RAGEngine:
     def _vector_search(self, query: str, user_id: int, file_ids: Optional[List[int]], k: int, importance: Optional[str]) -> List[Dict]:
         """Run Semantic Vector Search with ChromaDB."""
         try:
-            emb = embedding_model.encode([query]).tolist()
+            emb = [list(embed_query(query))]
             
             # ChromaDB requires explicit $and for multiple conditions
             if importance:
@@ -188,7 +205,7 @@ class RAGEngine:
     def _vector_search_targeted(self, query: str, user_id: int, file_ids: Optional[List[int]], k: int, sections: List[str]) -> List[Dict]:
         """Run Vector Search constrained to specific sections."""
         try:
-            emb = embedding_model.encode([query]).tolist()
+            emb = [list(embed_query(query))]
             
             # ChromaDB $or syntax for metadata fields can be tricky.
             # We use $in operator if supported, or iterative query if needed.
@@ -263,14 +280,21 @@ class RAGEngine:
 
     def _expand_context(self, docs: List[Dict]) -> List[Dict]:
         """Swap child chunks for parent context if available."""
+        # One batched doc-store lookup for every parent referenced by a child
+        parents = parent_store.get_many(
+            d["metadata"]["parent_id"] for d in docs
+            if d.get("metadata", {}).get("is_child", False) and d["metadata"].get("parent_id")
+        )
         expanded = []
         for d in docs:
             meta = d.get("metadata", {})
-            if meta.get("is_child", False) and meta.get("parent_content"):
-                # Use Parent Content for LLM
-                d["content"] = meta["parent_content"]
-                # Maybe mark as expanded for debug
-                d["expanded"] = True
+            if meta.get("is_child", False):
+                # Use Parent Content for LLM (inline parent_content: chunks indexed before parent_store)
+                parent_text = parents.get(meta.get("parent_id")) or meta.get("parent_content")
+                if parent_text:
+                    d["content"] = parent_text
+                    # Maybe mark as expanded for debug
+                    d["expanded"] = True
             expanded.append(d)
         return expanded
 
@@ -280,3 +304,6 @@ engine = RAGEngine()
 # Facade for backward compatibility
 def query_documents(query_text: str, user_id: int, file_ids: Optional[List[int]] = None, n_results: int = 3):
     return engine.query(query_text, user_id, file_ids, n_results)
+
+def query_documents_with_embedding(query_text: str, user_id: int, file_ids: Optional[List[int]] = None, n_results: int = 3):
+    return engine.query_with_embedding(query_text, user_id, file_ids, n_results)
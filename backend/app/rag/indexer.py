@@ -1,6 +1,7 @@
 import io
 import tempfile
 import os
+from functools import lru_cache
 from pydantic import BaseModel
 from typing import List, Optional
 import chromadb
@@ -9,7 +10,9 @@ from sentence_transformers import SentenceTransformer
 from pypdf import PdfReader
 from ..config import settings
 from .parsers.pdf_parser import pdf_parser
+from .parsers.pdf_cache import pdf_cache
 from .parsers.chunker import semantic_chunker
+from .parent_store import parent_store
 import logging
 
 logger = logging.getLogger(__name__)
@@ -28,6 +31,11 @@ def get_collection():
 # Initialize Embedding Model
 embedding_model = SentenceTransformer('all-MiniLM-L6-v2')
 
+@lru_cache(maxsize=1024)
+def embed_query(text: str) -> tuple:
+    """Embed a single query string; repeated queries are served from memory."""
+    return tuple(embedding_model.encode([text])[0].tolist())
+
 class DocumentChunk(BaseModel):
     id: str
     text: str
@@ -60,7 +68,8 @@ def extract_text_from_file(file_content: bytes, content_type: str, file_id: int)
                     # Fallback to basic extraction
                     return _fallback_pdf_extract(file_content), {}
             finally:
-                # Clean up temp file
+                # Clean up temp file (and the cached handle to it)
+                pdf_cache.evict(tmp_path)
                 if os.path.exists(tmp_path):
                     os.unlink(tmp_path)
                     
@@ -117,16 +126,16 @@ def process_and_index_file(file_id: int, file_content: bytes, content_type: str,
         logger.warning(f"No chunks created for file {file_id}")
         return
     
-    # 3. Create Embeddings
-    chunk_texts = [chunk["content"] for chunk in chunks]
-    embeddings = embedding_model.encode(chunk_texts, show_progress_bar=False).tolist()
-    
-    # 4. Prepare Data for ChromaDB
-    ids = [f"file_{file_id}_chunk_{i}" for i in range(len(chunks))]
-    metadatas = [chunk["metadata"] for chunk in chunks]
-    
-    # 5. Add to ChromaDB
     try:
+        # 3. Create Embeddings
+        chunk_texts = [chunk["content"] for chunk in chunks]
+        embeddings = embedding_model.encode(chunk_texts, show_progress_bar=False).tolist()
+        
+        # 4. Prepare Data for ChromaDB
+        ids = [f"file_{file_id}_chunk_{i}" for i in range(len(chunks))]
+        metadatas = [chunk["metadata"] for chunk in chunks]
+        
+        # 5. Add to ChromaDB
         collection = get_collection()
         collection.add(
             documents=chunk_texts,
@@ -137,4 +146,26 @@ def process_and_index_file(file_id: int, file_content: bytes, content_type: str,
         logger.info(f"Successfully indexed file {file_id} with {len(chunks)} chunks")
     except Exception as e:
         logger.error(f"Failed to index file {file_id}: {str(e)}")
+        # chunk_text already stored the parents; no vectors point at them now
+        try:
+            parent_store.delete_file(file_id)
+        except Exception as pe:
+            logger.warning(f"Failed to delete parents for file {file_id}: {pe}")
         raise
+
+
+def delete_file_index(file_id: int):
+    """
+    Remove a file's chunks from ChromaDB and its parents from parent_store.
+    Best effort: a failure is logged, not raised, so deleting the file
+    record itself never depends on the vector store being reachable.
+    """
+    try:
+        get_collection().delete(where={"file_id": file_id})
+    except Exception as e:
+        logger.warning(f"Failed to delete chunks for file {file_id}: {e}")
+    try:
+        removed = parent_store.delete_file(file_id)
+        logger.info(f"Deleted index data for file {file_id} ({removed} parents)")
+    except Exception as e:
+        logger.warning(f"Failed to delete parents for file {file_id}: {e}")
@@ -1,17 +1,22 @@
+import os
 import time
 import logging
 import sqlite3
 import uuid
-import json
+import orjson
 import threading
-from typing import Dict, List, Optional, Any
+import hashlib
+from itertools import islice
+from typing import Dict, List, Optional, Any, Iterator, Tuple
 from enum import Enum
 from pathlib import Path
+from concurrent.futures import Future, ProcessPoolExecutor
 
 # Integration points
 from .parsers.page_aware_parser import parse_pdf_with_pages as parse_academic_pdf
 from .parsers.chunker import semantic_chunker
 from .indexer import get_collection, embedding_model
+from .parent_store import parent_store
 
 logger = logging.getLogger(__name__)
 
@@ -39,6 +44,10 @@ class IngestionManager:
     _instance = None
     _lock = threading.RLock()
     
+    # Fixed SQL text so sqlite3's per-connection statement cache can reuse the plan
+    _SQL_STATUS = "UPDATE ingestion_jobs SET status=?, updated_at=? WHERE job_id=?"
+    _SQL_STATUS_ERR = "UPDATE ingestion_jobs SET status=?, updated_at=?, error_log=? WHERE job_id=?"
+    
     def __new__(cls, db_path: str = "ingestion.db"):
         if not cls._instance:
             with cls._lock:
@@ -50,11 +59,20 @@ class IngestionManager:
     def initialize(self, db_path: str):
         self.db_path = db_path
         self._setup_db()
+        # PDF text extraction is CPU-bound pure Python; run it in worker
+        # processes so parsing scales past one core instead of holding the GIL.
+        # Parallelism is per document here, so each parse runs its pages
+        # serially (workers=1) rather than starting a page pool per worker,
+        # and doesn't keep the file in the worker's PDF cache (parsed once).
+        self._parse_pool = ProcessPoolExecutor(max_workers=os.cpu_count())
         # Background worker for resume implementation would go here
 
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.db_path, cached_statements=256)
+
     def _setup_db(self):
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            with self._connect() as conn:
                 conn.execute("""
                     CREATE TABLE IF NOT EXISTS ingestion_jobs (
                         job_id TEXT PRIMARY KEY,
@@ -75,10 +93,10 @@ class IngestionManager:
         """Submit a new file for ingestion."""
         job_id = str(uuid.uuid4())
         now = time.time()
-        meta_json = json.dumps(extra_meta or {})
+        meta_json = orjson.dumps(extra_meta or {}).decode()  # metadata column is TEXT
         
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            with self._connect() as conn:
                 conn.execute("""
                     INSERT INTO ingestion_jobs (job_id, file_path, user_id, status, created_at, updated_at, metadata)
                     VALUES (?, ?, ?, ?, ?, ?, ?)
@@ -92,113 +110,200 @@ class IngestionManager:
             logger.error(f"Job Submission Failed: {e}")
             raise e
 
+    def submit_many(self, files: List[Tuple[str, int, Optional[Dict]]]) -> List[str]:
+        """
+        Submit several (file_path, user_id, extra_meta) files at once.
+        PDF parses run ahead in the process pool, at most one per CPU in
+        flight, so later documents parse while earlier jobs embed and index
+        without every document's chunk list being held at once.
+        """
+        now = time.time()
+        jobs = [(str(uuid.uuid4()), path, user_id, meta or {}) for path, user_id, meta in files]
+        
+        with self._connect() as conn:
+            conn.executemany("""
+                INSERT INTO ingestion_jobs (job_id, file_path, user_id, status, created_at, updated_at, metadata)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            """, [
+                (job_id, path, user_id, IngestionStatus.PENDING.value, now, now, orjson.dumps(meta).decode())
+                for job_id, path, user_id, meta in jobs
+            ])
+        logger.info(f"Jobs Submitted: {len(jobs)} files")
+        
+        window = os.cpu_count() or 1
+        futures: Dict[str, Future] = {}
+        ahead = iter(jobs)
+        for job_id, *_ in jobs:
+            # Top up the in-flight parses; this job's parse is always among them
+            while len(futures) < window:
+                nxt = next(ahead, None)
+                if nxt is None:
+                    break
+                next_id, path, user_id, meta = nxt
+                if path.lower().endswith('.pdf'):
+                    futures[next_id] = self._parse_pool.submit(
+                        parse_academic_pdf, path, meta.get("file_id", 0), user_id, workers=1, cache_pdf=False
+                    )
+            # Popped so the parsed chunks are freed once the job is indexed
+            self.process_job(job_id, parse_future=futures.pop(job_id, None))
+        return [job_id for job_id, *_ in jobs]
+
     def update_status(self, job_id: str, status: IngestionStatus, error: str = None):
         """Atomic state transition."""
         try:
-            with sqlite3.connect(self.db_path) as conn:
-                params = [status.value, time.time(), job_id]
-                sql = "UPDATE ingestion_jobs SET status = ?, updated_at = ? "
+            with self._connect() as conn:
                 if error:
-                    sql += ", error_log = ? "
-                    params.insert(2, error)
-                sql += "WHERE job_id = ?"
-                conn.execute(sql, tuple(params))
+                    conn.execute(self._SQL_STATUS_ERR, (status.value, time.time(), error, job_id))
+                else:
+                    conn.execute(self._SQL_STATUS, (status.value, time.time(), job_id))
             logger.info(f"Job {job_id} -> {status.value}")
         except Exception as e:
             logger.error(f"Status Update Failed: {e}")
 
-    def process_job(self, job_id: str):
+    def process_job(self, job_id: str, parse_future: Optional[Future] = None):
         """
         Execute the pipeline state machine.
         Reliability pattern: Fail fast, log deep.
+        parse_future: an already-submitted PDF parse for this job (see submit_many).
         """
+        collection = None
+        file_id = None
+        written = 0  # Chunks possibly in the collection (incl. a batch mid-add)
+        # Fixed-width ids: 16 hex chars of job digest + 8 hex chars of chunk index
+        id_root = hashlib.blake2b(job_id.encode(), digest_size=8).hexdigest()
         try:
             # 1. Fetch Job
-            with sqlite3.connect(self.db_path) as conn:
+            with self._connect() as conn:
                 row = conn.execute("SELECT file_path, user_id, metadata FROM ingestion_jobs WHERE job_id = ?", (job_id,)).fetchone()
                 if not row:
                     return
                 file_path, user_id, meta_json = row
-                extra_meta = json.loads(meta_json) if meta_json else {}
-            
-            chunks = []
+                extra_meta = orjson.loads(meta_json) if meta_json else {}
+                file_id = extra_meta.get("file_id")
             
-            # 2. State: PARSING
-            self.update_status(job_id, IngestionStatus.PARSING)
-            logger.info(f"Parsing file: {file_path}")
+            chunk_iter = self._iter_chunks(job_id, file_path, user_id, extra_meta, parse_future)
             
-            is_pdf = file_path.lower().endswith('.pdf')
-            if is_pdf:
-                # Use Research-Grade Parser
-                # Note: AcademicPDFParser handles layout analysis internally
-                raw_chunks = parse_academic_pdf(file_path)
+            # 4. State: EMBEDDING -> INDEXING, one batch live at a time.
+            # Each batch is encoded and added before the next is pulled, so
+            # peak memory is O(BATCH_SIZE * dim) rather than O(N * dim).
+            BATCH_SIZE = 64
+            total = 0
+            while True:
+                batch = list(islice(chunk_iter, BATCH_SIZE))
+                if not batch:
+                    break
+                
+                if collection is None:
+                    self.update_status(job_id, IngestionStatus.EMBEDDING)
+                
+                texts = [c["content"] for c in batch]
+                embeddings = embedding_model.encode(texts, show_progress_bar=False).tolist()
                 
-                # Convert AcademicChunk to dict format for storage
-                for rc in raw_chunks:
-                    chunks.append({
-                        "content": rc.text,
-                        "metadata": {
-                            **extra_meta, 
-                            **rc.metadata, 
-                            "user_id": user_id, 
-                            "job_id": job_id,
-                            "parser": "academic_pdf"
-                        }
-                    })
-            else:
-                # Fallback Flow for txt/md
-                try:
-                    with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
-                        text_content = f.read()
-                except FileNotFoundError:
-                     raise ValueError(f"File not found: {file_path}")
-
-                # 3. State: CHUNKING (Only for fallback)
-                self.update_status(job_id, IngestionStatus.CHUNKING)
-                chunks = semantic_chunker.chunk_text(text_content, metadata={**extra_meta, "user_id": user_id, "job_id": job_id})
+                if collection is None:
+                    # 5. State: INDEXING from the first add, since batches go
+                    # into the collection as they are embedded
+                    self.update_status(job_id, IngestionStatus.INDEXING)
+                    collection = get_collection()
+                
+                written = total + len(batch)
+                collection.add(
+                    ids=[f"{id_root}{total + i:08x}" for i in range(len(batch))],
+                    documents=texts,
+                    embeddings=embeddings,
+                    metadatas=[c["metadata"] for c in batch]
+                )
+                total = written
             
-            if not chunks:
+            if not total:
                 logger.warning(f"No chunks generated for {job_id}")
                 self.update_status(job_id, IngestionStatus.COMPLETE) # Technically done, just empty
                 return
-
-            # 4. State: EMBEDDING
-            self.update_status(job_id, IngestionStatus.EMBEDDING)
-            texts = [c["content"] for c in chunks]
-            
-            # Batch embedding if large
-            BATCH_SIZE = 32
-            embeddings = []
-            for i in range(0, len(texts), BATCH_SIZE):
-                batch_texts = texts[i : i + BATCH_SIZE]
-                batch_embs = embedding_model.encode(batch_texts, show_progress_bar=False).tolist()
-                embeddings.extend(batch_embs)
-            
-            # 5. State: INDEXING
-            self.update_status(job_id, IngestionStatus.INDEXING)
-            collection = get_collection()
-            
-            ids = [f"job_{job_id}_chunk_{i}" for i in range(len(chunks))]
-            metadatas = [c["metadata"] for c in chunks]
-            
-            collection.add(
-                ids=ids,
-                documents=texts,
-                embeddings=embeddings,
-                metadatas=metadatas
-            )
             
             # 6. Done
             self.update_status(job_id, IngestionStatus.COMPLETE)
-            logger.info(f"Ingestion Complete: {len(chunks)} chunks indexed.")
+            logger.info(f"Ingestion Complete: {total} chunks indexed.")
             
         except Exception as e:
+            if written:
+                self._rollback_chunks(collection, id_root, written)
+            if file_id is not None:
+                # Chunking may have stored parents before anything was indexed
+                self._rollback_parents(file_id)
             self.update_status(job_id, IngestionStatus.FAILED, str(e))
             logger.error(f"Ingestion Job {job_id} Failed: {e}", exc_info=True)
 
+    @staticmethod
+    def _rollback_chunks(collection, id_root: str, count: int):
+        """Delete a failed job's already-added chunks so no partial file stays searchable."""
+        try:
+            collection.delete(ids=[f"{id_root}{i:08x}" for i in range(count)])
+        except Exception as e:
+            logger.error(f"Rollback of {count} chunks ({id_root}) failed: {e}")
+
+    @staticmethod
+    def _rollback_parents(file_id: int):
+        """Delete a failed job's parent chunks, which chunk_text stores up front."""
+        try:
+            parent_store.delete_file(file_id)
+        except Exception as e:
+            logger.error(f"Rollback of parents for file {file_id} failed: {e}")
+
+    def _iter_chunks(
+        self, job_id: str, file_path: str, user_id: int, extra_meta: Dict,
+        parse_future: Optional[Future] = None
+    ) -> Iterator[Dict]:
+        """
+        Yield storage-ready chunks one at a time.
+        Branches on file type: page-aware PDF parser, semantic chunker otherwise.
+        """
+        # 2. State: PARSING
+        self.update_status(job_id, IngestionStatus.PARSING)
+        logger.info(f"Parsing file: {file_path}")
+        
+        is_pdf = file_path.lower().endswith('.pdf')
+        if is_pdf:
+            # Use Research-Grade Parser
+            # Note: PageAwarePDFParser handles page/section tracking internally
+            # Only picklable primitives cross the process boundary
+            if parse_future is None:
+                parse_future = self._parse_pool.submit(
+                    parse_academic_pdf, file_path, extra_meta.get("file_id", 0), user_id, workers=1, cache_pdf=False
+                )
+            raw_chunks = parse_future.result()
+            
+            # Convert parser chunks to storage format (metadata dicts built per chunk here)
+            for rc in raw_chunks:
+                md = rc.metadata()
+                ps = md.get("page_start", 1)
+                pe = md.get("page_end", ps)
+                yield {
+                    "content": rc.text,
+                    "metadata": {
+                        **extra_meta, 
+                        **md, 
+                        # Citation labels are fixed after ingest; precompute for _format_context
+                        "page_info": f"p. {ps}" if ps == pe else f"pp. {ps}-{pe}",
+                        "section_label": md.get("section", "General"),
+                        "user_id": user_id, 
+                        "job_id": job_id,
+                        "parser": "academic_pdf"
+                    }
+                }
+        else:
+            # Fallback Flow for txt/md
+            try:
+                with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
+                    text_content = f.read()
+            except FileNotFoundError:
+                 raise ValueError(f"File not found: {file_path}")
+
+            # 3. State: CHUNKING (Only for fallback)
+            self.update_status(job_id, IngestionStatus.CHUNKING)
+            yield from semantic_chunker.chunk_text(text_content, metadata={**extra_meta, "user_id": user_id, "job_id": job_id})
+
     def get_job_status(self, job_id: str) -> Dict:
         """Get public status of a job."""
-        with sqlite3.connect(self.db_path) as conn:
+        with self._connect() as conn:
             row = conn.execute("SELECT status, error_log FROM ingestion_jobs WHERE job_id = ?", (job_id,)).fetchone()
             if row:
                 return {"status": row[0], "error": row[1]}
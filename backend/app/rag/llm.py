@@ -1,85 +1,334 @@
-import requests
-from typing import List, Dict
+import time
+import random
+import asyncio
+import httpx
+import orjson
+import tiktoken
+import threading
+from hashlib import blake2b
+from collections import OrderedDict
+from functools import lru_cache
+from typing import List, Dict, Optional, Callable, AsyncIterator, Sequence
 from ..config import settings
 import logging
+from .prompts import PROMPTS, PromptStyle, SYSTEM_PROMPT_NATURAL as SYSTEM_PROMPT  # re-exported for existing imports
+from .metrics import metrics
+from .semantic_cache import semantic_cache
 
 logger = logging.getLogger(__name__)
 
-# NEUTRAL SYSTEM PROMPT - NO FORCED FORMATTING
-SYSTEM_PROMPT = """You are a helpful study assistant. Answer questions using the provided context.
+# Tokenizer used to budget the prompt. cl100k_base is close enough to the
+# Llama tokenizer for sizing purposes and is loaded once per process.
+_ENCODING = tiktoken.get_encoding("cl100k_base")
 
-### RULES:
+# Tokens kept free for the chat envelope (role markers, instructions) on top
+# of the system prompt and query, which are measured per request.
+PROMPT_OVERHEAD_TOKENS = 64
 
-1. **Answer naturally**: Respond in the most appropriate format for the question and content.
-2. **Be direct**: Start with the answer, not preambles.
-3. **Cite sources**: When referencing specific information, mention the page if available.
-4. **No invention**: Only use information from the provided context.
-5. **Match the content**: 
-   - For exam questions/PYQs: List the questions and answers directly
-   - For lecture notes: Explain the concepts clearly
-   - For any document: Summarize the key points naturally
+def _count_tokens(text: str) -> int:
+    return len(_ENCODING.encode(text))
 
-### CONTEXT FORMAT:
-[Source: Section, p. X]
-Content here...
+# Chunk texts recur across queries (retriever/cache results are reused), so
+# their token counts are memoized by content rather than stored on the
+# caller's chunk dicts, which are returned to clients as sources
+@lru_cache(maxsize=2048)
+def _content_tokens(content: str) -> int:
+    return _count_tokens(content)
 
-### DO NOT:
-- Force a "Problem/Method/Results" structure on non-research documents
-- Treat exam papers or PYQs as research papers
-- Add unnecessary academic formatting
+# Answer cache: bounded LRU of final answers with a TTL, keyed on what
+# determines the Groq call (query, retrieved chunk ids, model, sampling).
+# Students re-asking the same question over the same chunks skip the round-trip.
+ANSWER_CACHE_SIZE = 2048
+ANSWER_CACHE_TTL = 3600  # Seconds
+_answer_cache: "OrderedDict[bytes, tuple]" = OrderedDict()
+_answer_cache_lock = threading.Lock()
 
-Just answer naturally and helpfully.
-"""
+def _answer_cache_key(query: str, chunks: List[Dict], *extra: str) -> bytes:
+    ids = sorted(source_id(c.get("metadata") or {}, i) for i, c in enumerate(chunks, 1))
+    h = blake2b(digest_size=16)
+    for part in (query, "|".join(ids), _BODY_BASE["model"], str(_BODY_BASE["temperature"]), *extra):
+        h.update(part.encode())
+        h.update(b"\x00")
+    return h.digest()
 
-def _format_context(chunks: List[Dict]) -> str:
-    """Format chunks with page metadata for LLM to cite."""
+def _answer_cache_get(key: bytes) -> Optional[str]:
+    with _answer_cache_lock:
+        entry = _answer_cache.get(key)
+        if entry is None:
+            return None
+        answer, expires_at = entry
+        if time.time() >= expires_at:
+            del _answer_cache[key]
+            return None
+        _answer_cache.move_to_end(key)
+        return answer
+
+def _answer_cache_put(key: bytes, answer: str):
+    with _answer_cache_lock:
+        _answer_cache[key] = (answer, time.time() + ANSWER_CACHE_TTL)
+        _answer_cache.move_to_end(key)
+        if len(_answer_cache) > ANSWER_CACHE_SIZE:
+            _answer_cache.popitem(last=False)
+
+GROQ_BASE_URL = "https://api.groq.com"
+GROQ_CHAT_PATH = "/openai/v1/chat/completions"
+
+MetaFormatter = Callable[[Dict, int], str]
+
+def page_source_header(metadata: Dict, idx: int) -> str:
+    """Default chunk header: section plus page range, e.g. [Source: Methods, pp. 3-4]."""
+    # Labels are precomputed at ingest; chunks indexed before that fall back below.
+    # Explicit None checks avoid evaluating nested .get() defaults on the hot path.
+    md_get = metadata.get
+    page_info = md_get("page_info")
+    section = md_get("section_label")
+    if page_info is None:
+        page_start = md_get("page_start")
+        if page_start is None:
+            page_start = md_get("page", 1)
+        page_end = md_get("page_end")
+        if page_end is None:
+            page_end = page_start
+        
+        # Format page range
+        if page_start == page_end:
+            page_info = f"p. {page_start}"
+        else:
+            page_info = f"pp. {page_start}-{page_end}"
+    if section is None:
+        section = md_get("section", "General")
+    
+    return f"[Source: {section}, {page_info}]"
+
+def source_id(metadata: Dict, idx: int) -> str:
+    """Stable citation key: file_id:chunk_index (falls back to position)."""
+    md_get = metadata.get
+    fid = md_get("file_id", 0)
+    cid = md_get("sub_chunk_index")
+    if cid is None:
+        cid = md_get("chunk_index", idx)
+    return f"{fid}:{cid}"
+
+def source_id_header(metadata: Dict, idx: int) -> str:
+    """Header for strict-citation prompts, e.g. [Source ID: 12:4] (Section: Results)."""
+    return f"[Source ID: {source_id(metadata, idx)}] (Section: {metadata.get('section', 'General')})"
+
+def _format_context(
+    chunks: List[Dict],
+    token_budget: Optional[int] = None,
+    meta_formatter: Optional[MetaFormatter] = None,
+    query_embedding: Optional[Sequence[float]] = None
+) -> str:
+    """
+    Format chunks with a citation header for LLM to cite.
+    
+    meta_formatter builds each header from (metadata, position); defaults to
+    page_source_header. When token_budget is given, whole chunks are packed
+    in retrieval order until the budget is spent, so a source is never cut
+    mid-citation.
+    """
     if not chunks:
         return "No relevant context found."
     
-    context_parts = []
+    meta_formatter = meta_formatter or page_source_header
+    # Header/body are counted separately; the two newlines and separator are
+    # a fixed per-chunk overhead, close enough for budgeting.
+    separator_tokens = _count_tokens("\n---\n")
+    tok_used = 0
+    packed = 0
+    # One slot per chunk, reserved up front; separators are embedded in each
+    # part so a single "".join builds the result
+    parts = [None] * len(chunks)
     for idx, chunk in enumerate(chunks, 1):
-        metadata = chunk.get("metadata", {})
+        metadata = chunk.get("metadata") or {}
         content = chunk.get("content", "")
         
-        # Extract page information from metadata
-        page_start = metadata.get("page_start", metadata.get("page", 1))
-        page_end = metadata.get("page_end", page_start)
-        section = metadata.get("section", "General")
+        header = meta_formatter(metadata, idx)
         
-        # Format page range
-        if page_start == page_end:
-            page_info = f"p. {page_start}"
-        else:
-            page_info = f"pp. {page_start}-{page_end}"
+        if token_budget is not None:
+            part_tokens = _count_tokens(header) + _content_tokens(content) + 2
+            if packed:
+                part_tokens += separator_tokens
+            if tok_used + part_tokens > token_budget:
+                if not packed:
+                    # Top-ranked chunk alone exceeds the budget: keep its head
+                    tokens = _ENCODING.encode(f"{header}\n{content}\n")[:max(token_budget, 0)]
+                    parts[0] = _ENCODING.decode(tokens) + "\n[Context truncated due to length...]"
+                    packed = 1
+                logger.info(f"Context budget reached: packed {packed}/{len(chunks)} chunks ({tok_used} tokens)")
+                break
+            tok_used += part_tokens
         
-        # Build header with page info
-        header = f"[Source: {section}, {page_info}]"
-        context_parts.append(f"{header}\n{content}\n")
+        if packed:
+            parts[packed] = f"\n---\n{header}\n{content}\n"
+        else:
+            parts[0] = f"{header}\n{content}\n"
+        packed += 1
     
-    return "\n---\n".join(context_parts)
+    if packed < len(parts):
+        del parts[packed:]
+    return "".join(parts)
+
+# Request statics, built once per process
+_HEADERS = {
+    "Authorization": f"Bearer {settings.GROQ_API_KEY}",
+    "Content-Type": "application/json"
+}
+_BODY_BASE = {
+    "model": settings.GROQ_MODEL,
+    "temperature": 0.3,  # Lower for more focused answers
+    "max_tokens": 1024,
+    "top_p": 0.95
+}
 
-def generate_response(query: str, context_chunks: List[Dict], filename: str = "document.pdf") -> str:
+# Shared async client: keep-alive reuses warm TLS sessions and HTTP/2
+# multiplexes concurrent queries over a few sockets. Closed on app shutdown.
+_client = httpx.AsyncClient(
+    base_url=GROQ_BASE_URL,
+    http2=True,
+    timeout=settings.GROQ_TIMEOUT,
+    limits=httpx.Limits(max_keepalive_connections=100, max_connections=200)
+)
+
+async def aclose_client():
+    """Release pooled Groq connections (FastAPI shutdown hook)."""
+    await _client.aclose()
+
+# 429 handling: honor Retry-After (capped) plus jitter, a few attempts total
+GROQ_MAX_ATTEMPTS = 3
+GROQ_MAX_RETRY_DELAY = 8.0  # Seconds
+
+def _retry_delay(response: httpx.Response, attempt: int) -> float:
+    try:
+        delay = float(response.headers.get("retry-after", 2 ** attempt))
+    except ValueError:  # HTTP-date form
+        delay = 2 ** attempt
+    return min(delay, GROQ_MAX_RETRY_DELAY) + random.uniform(0, 0.25)
+
+async def _send(content: bytes, headers: Dict, *, stream: bool = False) -> httpx.Response:
     """
-    Generate high-quality response using Groq API.
+    POST a serialized body to the Groq chat endpoint, retrying on 429.
+    The last response is returned as-is (caller checks status; streamed
+    responses must be closed by the caller).
+    """
+    request = _client.build_request("POST", GROQ_CHAT_PATH, headers=headers, content=content)
+    attempt = 0
+    while True:
+        response = await _client.send(request, stream=stream)
+        attempt += 1
+        if response.status_code != 429 or attempt >= GROQ_MAX_ATTEMPTS:
+            return response
+        delay = _retry_delay(response, attempt - 1)
+        await response.aclose()
+        logger.warning(f"Groq rate limited; retrying in {delay:.2f}s (attempt {attempt}/{GROQ_MAX_ATTEMPTS})")
+        await asyncio.sleep(delay)
+
+async def _chat_completion(
+    messages: List[Dict],
+    *,
+    api_key: Optional[str] = None,
+    **overrides
+) -> Optional[str]:
+    """
+    POST a chat completion to Groq and return the first choice's content.
     
-    Uses 7-layer production pipeline:
-    1. Document Type Detection
-    2. Intent Routing
-    3. Domain Rules
-    4. Context Quality Check
-    5. Answer Self-Validation
-    6. Style Adapter
-    7. Failure Logging
+    The body is _BODY_BASE plus any overrides (model, temperature, ...).
+    Returns None when the API answers without choices; transport and HTTP
+    errors propagate as httpx exceptions (see groq_error_message).
     """
-    from .production_pipeline import run_pipeline, post_validate, log_failure
+    body = {**_BODY_BASE, **overrides, "messages": messages}
+    headers = _HEADERS
+    if api_key and api_key != settings.GROQ_API_KEY:
+        headers = {**_HEADERS, "Authorization": f"Bearer {api_key}"}
     
-    # Format context with structure
-    context = _format_context(context_chunks)
+    response = await _send(orjson.dumps(body), headers)
+    response.raise_for_status()
+    result = orjson.loads(response.content)
+    _record_usage(result)
     
-    # Limit context size
-    MAX_CONTEXT_LENGTH = 8000
-    if len(context) > MAX_CONTEXT_LENGTH:
-        context = context[:MAX_CONTEXT_LENGTH] + "\n\n[Context truncated due to length...]"
+    if "choices" in result and len(result["choices"]) > 0:
+        return result["choices"][0]["message"]["content"]
+    return None
+
+def _record_usage(result: Dict):
+    """Forward Groq token usage, including prompt-cache hits, to metrics."""
+    usage = result.get("usage") or {}
+    details = usage.get("prompt_tokens_details") or {}
+    cached = details.get("cached_tokens")
+    if cached is None:
+        # Older responses report it under the Groq extension block
+        cached = ((result.get("x_groq") or {}).get("usage") or {}).get("cached_tokens", 0)
+    metrics.record_llm_usage(
+        usage.get("prompt_tokens", 0),
+        usage.get("completion_tokens", 0),
+        cached or 0
+    )
+
+def groq_error_message(e: Exception) -> str:
+    """Map a failed Groq call to a user-facing error string."""
+    if isinstance(e, httpx.HTTPStatusError):
+        try:
+            error_detail = orjson.loads(e.response.content)
+            logger.error(f"Groq API error: {error_detail}")
+        except:
+            logger.error(f"Groq API error: {e.response.text}")
+        
+        if e.response.status_code == 400:
+            return "Error: Invalid request to AI service. The context may be too complex. Try a simpler question."
+        elif e.response.status_code == 401:
+            return "Error: Invalid Groq API key."
+        elif e.response.status_code == 429:
+            return "Error: Groq API rate limit exceeded. Please try again later."
+        else:
+            return f"Error: Groq API returned {e.response.status_code}"
+    if isinstance(e, httpx.TimeoutException):
+        return "Error: Groq API request timed out."
+    if isinstance(e, httpx.TransportError):
+        return "Error: Could not connect to Groq API. Check your internet connection."
+    logger.error(f"Unexpected error in Groq call: {str(e)}")
+    return f"Error generating response: {str(e)}"
+
+# Message envelopes, built once; only the variable slots are filled per request
+_SYS_TMPL = """{system_prompt}
+Context from documents:
+{context}"""
+_USER_TMPL = """User Intent: {intent}
+Question: {query}
+
+Answer based on the context above. Be direct and match the document style."""
+
+def _variant(style: Optional[str], meta_formatter: Optional[MetaFormatter]) -> str:
+    return f"{style or ''}|{getattr(meta_formatter, '__qualname__', '')}"
+
+def _cache_key_for(query: str, context_chunks: List[Dict], style: Optional[str], meta_formatter: Optional[MetaFormatter]) -> bytes:
+    return _answer_cache_key(query, context_chunks, _variant(style, meta_formatter))
+
+def _semantic_lookup(query_embedding: Optional[Sequence[float]], context_chunks: List[Dict], variant: str) -> tuple:
+    """
+    Second cache tier: a rephrased question over (nearly) the same chunks.
+    Returns (answer or None, entry) where entry is passed to _finish_answer
+    so a miss can be stored once the real answer arrives.
+    
+    query_embedding is the vector retrieval already searched with (see
+    RAGEngine.query_with_embedding); without one the tier is skipped rather
+    than encoding the question again.
+    """
+    if query_embedding is None:
+        return None, None
+    ids = {source_id(c.get("metadata") or {}, i) for i, c in enumerate(context_chunks, 1)}
+    answer = semantic_cache.lookup(query_embedding, ids, variant)
+    metrics.record_semantic_cache(answer is not None)
+    return answer, (query_embedding, ids, variant)
+
+def _build_messages(
+    query: str,
+    context_chunks: List[Dict],
+    filename: str,
+    style: Optional[PromptStyle],
+    meta_formatter: Optional[MetaFormatter]
+) -> tuple:
+    """Run the pipeline and assemble chat messages. Returns (pipeline_result, context, messages)."""
+    from .production_pipeline import run_pipeline
     
     # Run 7-layer pipeline (Layers 1-4, 6)
     pipeline_result = run_pipeline(query, filename, context_chunks)
@@ -88,76 +337,181 @@ def generate_response(query: str, context_chunks: List[Dict], filename: str = "d
     if pipeline_result.issues:
         logger.warning(f"Pipeline issues: {pipeline_result.issues}")
     
-    # Build messages with pipeline-generated prompt
+    system_prompt = PROMPTS[style] if style else pipeline_result.system_prompt
+    
+    # Format context with structure, packed to the prompt token budget
+    reserved = (
+        _count_tokens(system_prompt)
+        + _count_tokens(query)
+        + PROMPT_OVERHEAD_TOKENS
+    )
+    context = _format_context(
+        context_chunks,
+        token_budget=settings.GROQ_MAX_PROMPT_TOKENS - reserved,
+        meta_formatter=meta_formatter
+    )
+    
+    # Build messages with pipeline-generated prompt. Everything that is
+    # stable across follow-up questions (instructions, then retrieved context)
+    # forms the leading system message so Groq's prefix cache can reuse it;
+    # the per-query intent and question come last.
     messages = [
         {
             "role": "system",
-            "content": pipeline_result.system_prompt
+            "content": _SYS_TMPL.format(system_prompt=system_prompt, context=context)
         },
         {
             "role": "user",
-            "content": f"""Context from documents:
-{context}
-
-Question: {query}
-
-Answer based on the context above. Be direct and match the document style."""
+            "content": _USER_TMPL.format(intent=pipeline_result.intent.value, query=query)
         }
     ]
+    return pipeline_result, context, messages
+
+def _finish_answer(answer: str, query: str, pipeline_result, context: str, cache_key: bytes, semantic_entry: tuple):
+    """Layer 5 post-validation, then cache the answer in both tiers."""
+    from .production_pipeline import post_validate
+    
+    # Layer 5: Post-validation
+    is_valid, issues = post_validate(answer, query, pipeline_result, context)
+    if not is_valid:
+        logger.warning(f"Answer validation failed: {issues}")
+        # Don't regenerate for now, just log
+        # Future: could retry with stricter prompt
+    
+    # Only real answers are cached; error strings never reach this point
+    _answer_cache_put(cache_key, answer)
+    if semantic_entry is not None:
+        qvec, ids, variant = semantic_entry
+        semantic_cache.add(qvec, ids, answer, variant)
+
+async def generate_response(
+    query: str,
+    context_chunks: List[Dict],
+    filename: str = "document.pdf",
+    *,
+    style: Optional[PromptStyle] = None,
+    meta_formatter: Optional[MetaFormatter] = None,
+    query_embedding: Optional[Sequence[float]] = None
+) -> str:
+    """
+    Generate high-quality response using Groq API.
+    
+    Uses 7-layer production pipeline:
+    1. Document Type Detection
+    2. Intent Routing
+    3. Domain Rules
+    4. Context Quality Check
+    5. Answer Self-Validation
+    6. Style Adapter
+    7. Failure Logging
+    
+    style selects a fixed system prompt from prompts.PROMPTS instead of the
+    pipeline-generated one; meta_formatter controls the per-chunk citation
+    header; query_embedding (the retrieval vector) enables the semantic
+    answer cache.
+    """
+    # Exact-match cache: checked before any prompt work
+    cache_key = _cache_key_for(query, context_chunks, style, meta_formatter)
+    cached = _answer_cache_get(cache_key)
+    if cached is not None:
+        logger.info("Answer cache hit")
+        return cached
+    
+    cached, semantic_entry = _semantic_lookup(query_embedding, context_chunks, _variant(style, meta_formatter))
+    if cached is not None:
+        logger.info("Semantic cache hit")
+        _answer_cache_put(cache_key, cached)
+        return cached
+    
+    pipeline_result, context, messages = _build_messages(
+        query, context_chunks, filename, style, meta_formatter
+    )
     
     try:
-        response = requests.post(
-            "https://api.groq.com/openai/v1/chat/completions",
-            headers={
-                "Authorization": f"Bearer {settings.GROQ_API_KEY}",
-                "Content-Type": "application/json"
-            },
-            json={
-                "model": settings.GROQ_MODEL,
-                "messages": messages,
-                "temperature": 0.3,  # Lower for more focused answers
-                "max_tokens": 1024,
-                "top_p": 0.95
-            },
-            timeout=settings.GROQ_TIMEOUT
-        )
-        response.raise_for_status()
-        result = response.json()
-        
-        if "choices" in result and len(result["choices"]) > 0:
-            answer = result["choices"][0]["message"]["content"]
-            
-            # Layer 5: Post-validation
-            is_valid, issues = post_validate(answer, query, pipeline_result, context)
-            if not is_valid:
-                logger.warning(f"Answer validation failed: {issues}")
-                # Don't regenerate for now, just log
-                # Future: could retry with stricter prompt
-            
-            return answer
-        else:
-            return "No response generated."
-            
-    except requests.exceptions.HTTPError as e:
-        error_detail = ""
+        answer = await _chat_completion(messages)
+    except Exception as e:
+        return groq_error_message(e)
+    
+    if answer is None:
+        return "No response generated."
+    
+    _finish_answer(answer, query, pipeline_result, context, cache_key, semantic_entry)
+    return answer
+
+async def stream_response(
+    query: str,
+    context_chunks: List[Dict],
+    filename: str = "document.pdf",
+    *,
+    style: Optional[PromptStyle] = None,
+    meta_formatter: Optional[MetaFormatter] = None,
+    query_embedding: Optional[Sequence[float]] = None
+) -> AsyncIterator[str]:
+    """
+    Streaming variant of generate_response: yields answer text deltas as
+    Groq produces them (SSE, "stream": true), so callers can forward tokens
+    at TTFT instead of waiting for the full completion.
+    
+    An error before any delta is yielded as a single error string, as
+    generate_response returns it; after a partial answer it is raised, so
+    the error text is never appended to the answer.
+    """
+    cache_key = _cache_key_for(query, context_chunks, style, meta_formatter)
+    cached = _answer_cache_get(cache_key)
+    if cached is not None:
+        logger.info("Answer cache hit")
+        yield cached
+        return
+    
+    cached, semantic_entry = _semantic_lookup(query_embedding, context_chunks, _variant(style, meta_formatter))
+    if cached is not None:
+        logger.info("Semantic cache hit")
+        _answer_cache_put(cache_key, cached)
+        yield cached
+        return
+    
+    pipeline_result, context, messages = _build_messages(
+        query, context_chunks, filename, style, meta_formatter
+    )
+    body = {**_BODY_BASE, "messages": messages, "stream": True}
+    
+    parts = []
+    content = orjson.dumps(body)
+    try:
+        response = await _send(content, _HEADERS, stream=True)
         try:
-            error_detail = e.response.json()
-            logger.error(f"Groq API error: {error_detail}")
-        except:
-            logger.error(f"Groq API error: {e.response.text}")
-        
-        if e.response.status_code == 400:
-            return "Error: Invalid request to AI service. The context may be too complex. Try a simpler question."
-        elif e.response.status_code == 401:
-            return "Error: Invalid Groq API key."
-        elif e.response.status_code == 429:
-            return "Error: Groq API rate limit exceeded. Please try again later."
-        else:
-            return f"Error: Groq API returned {e.response.status_code}"
-    except requests.exceptions.ConnectionError:
-        return "Error: Could not connect to Groq API. Check your internet connection."
-    except requests.exceptions.Timeout:
-        return "Error: Groq API request timed out."
+            if response.status_code >= 400:
+                await response.aread()  # Load the error body for groq_error_message
+                response.raise_for_status()
+            
+            async for line in response.aiter_lines():
+                if not line.startswith("data: "):
+                    continue
+                data = line[6:]
+                if data == "[DONE]":
+                    break
+                event = orjson.loads(data)
+                if "x_groq" in event and "usage" in event["x_groq"]:
+                    # Final chunk carries usage under the Groq extension block
+                    event["usage"] = event["x_groq"]["usage"]
+                    _record_usage(event)
+                choices = event.get("choices")
+                if not choices:
+                    continue
+                delta = choices[0].get("delta", {}).get("content")
+                if delta:
+                    parts.append(delta)
+                    yield delta
+        finally:
+            await response.aclose()
     except Exception as e:
-        logger.error(f"Unexpected error in generate_response: {str(e)}")
-        return f"Error generating response: {str(e)}"
+        if parts:
+            raise
+        yield groq_error_message(e)
+        return
+    
+    if not parts:
+        yield "No response generated."
+        return
+    
+    _finish_answer("".join(parts), query, pipeline_result, context, cache_key, semantic_entry)
@@ -1,14 +1,21 @@
 import time
+import random
 import logging
 import json
 import sqlite3
 import statistics
 from datetime import datetime
-from collections import deque, Counter
+from array import array
+from collections import Counter
+from bisect import bisect_left, insort
 from typing import Dict, List, Optional, Tuple
 import threading
+import queue
+import atexit
 from pathlib import Path
 
+from ..config import settings
+
 logger = logging.getLogger(__name__)
 
 class MetricsTracker:
@@ -25,35 +32,79 @@ class MetricsTracker:
     - Daily stats rollup
     """
     
-    _instance = None
-    _lock = threading.Lock()
-    
-    def __new__(cls, db_path: str = "metrics.db"):
-        if not cls._instance:
-            with cls._lock:
-                if not cls._instance:
-                    cls._instance = super(MetricsTracker, cls).__new__(cls)
-                    cls._instance.initialize(db_path)
-        return cls._instance
+    _INSERT_SQL = """
+        INSERT INTO request_logs 
+        (timestamp, latency_ms, status_code, success, unsupported_claims, error_type, tokens_in, tokens_out, ttft_ms, sample_weight)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    """
+    FLUSH_BATCH = 500      # Max rows per transaction
+    FLUSH_INTERVAL = 0.2   # Seconds to wait for a batch to fill
     
-    def initialize(self, db_path: str):
-        """Initialize the metrics engine."""
+    def __init__(self, db_path: str = "metrics.db", sample_rate: float = 1.0):
+        """
+        Initialize the metrics engine. Use the module-level `metrics` instance.
+        sample_rate is the fraction of successful requests written to SQLite;
+        failures are always written, and each row carries its sample weight.
+        """
         self.db_path = db_path
+        self.sample_rate = min(max(sample_rate, 1e-6), 1.0)
+        
+        # One long-lived connection in WAL mode: no per-insert open/close and
+        # no rollback-journal rewrite on every commit. Autocommit mode.
+        self._conn = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("PRAGMA temp_store=MEMORY")
+        self._db_lock = threading.Lock()
         self._setup_db()
         
+        # Request threads only enqueue rows; one daemon thread batches them to disk
+        self._q = queue.SimpleQueue()
+        threading.Thread(target=self._flush_loop, name="metrics-writer", daemon=True).start()
+        atexit.register(self.flush)
+        
         # Real-time windows (last 1000 requests)
         self.window_size = 1000
-        self.rt_latencies = deque(maxlen=self.window_size)
-        self.rt_failures = deque(maxlen=self.window_size)
-        self.rt_ucr_events = deque(maxlen=self.window_size)
         
-        # Error tracking
+        # Latency ring as uint16 milliseconds (2 bytes/entry instead of a
+        # boxed float); shares _ring_idx with the flag buffers below
+        self._lat = array("H", [0]) * self.window_size
+        self._lat_n = 0
+        
+        # Failure / UCR flags as fixed ring buffers with running sums, so
+        # rates are read without scanning the window
+        self._fail_buf = [0] * self.window_size
+        self._ucr_buf = [0] * self.window_size
+        self._ring_idx = 0
+        self._fail_sum = 0
+        self._ucr_sum = 0
+        
+        # Latency window kept sorted incrementally (insort on append, bisect
+        # removal on eviction) so percentile reads are index lookups
+        self._lat_sorted = array("H")
+        self._lat_sum = 0
+        self._stats_lock = threading.Lock()
+        
+        # Error tracking (top-N recomputed only after a new error is counted)
         self.error_counts = Counter()
+        self._errors_dirty = False
+        self._top_errors_cache: List[Tuple[str, int]] = []
+        
+        # LLM token usage (cumulative since process start)
+        self.llm_calls = 0
+        self.llm_prompt_tokens = 0
+        self.llm_completion_tokens = 0
+        self.llm_cached_tokens = 0
+        
+        # Semantic answer cache (llm.py second tier)
+        self.semantic_lookups = 0
+        self.semantic_hits = 0
         
     def _setup_db(self):
         """Create metrics schema if not exists."""
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            with self._db_lock:
+                conn = self._conn
                 conn.execute("""
                     CREATE TABLE IF NOT EXISTS request_logs (
                         id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -64,10 +115,64 @@ class MetricsTracker:
                         unsupported_claims INT,
                         error_type TEXT,
                         tokens_in INT,
-                        tokens_out INT
+                        tokens_out INT,
+                        ttft_ms REAL,
+                        sample_weight REAL DEFAULT 1.0
                     )
                 """)
                 conn.execute("CREATE INDEX IF NOT EXISTS idx_ts ON request_logs(timestamp)")
+                # Added with streaming responses; migrate older databases in place
+                cols = {row[1] for row in conn.execute("PRAGMA table_info(request_logs)")}
+                if "ttft_ms" not in cols:
+                    conn.execute("ALTER TABLE request_logs ADD COLUMN ttft_ms REAL")
+                if "sample_weight" not in cols:
+                    # Trigger below is recreated to aggregate by weight
+                    conn.execute("ALTER TABLE request_logs ADD COLUMN sample_weight REAL DEFAULT 1.0")
+                    conn.execute("DROP TRIGGER IF EXISTS trg_daily_stats")
+                
+                # Materialized daily rollup, maintained by trigger on every insert
+                new_rollup = conn.execute(
+                    "SELECT 1 FROM sqlite_master WHERE type='table' AND name='daily_stats'"
+                ).fetchone() is None
+                conn.execute("""
+                    CREATE TABLE IF NOT EXISTS daily_stats (
+                        day TEXT PRIMARY KEY,
+                        total REAL,
+                        lat_sum REAL,
+                        errors REAL,
+                        halluc REAL
+                    )
+                """)
+                conn.execute("""
+                    CREATE TRIGGER IF NOT EXISTS trg_daily_stats AFTER INSERT ON request_logs
+                    BEGIN
+                        INSERT INTO daily_stats (day, total, lat_sum, errors, halluc)
+                        VALUES (
+                            date(new.timestamp, 'unixepoch'), new.sample_weight,
+                            new.latency_ms * new.sample_weight,
+                            CASE WHEN new.success THEN 0 ELSE new.sample_weight END,
+                            new.unsupported_claims * new.sample_weight
+                        )
+                        ON CONFLICT(day) DO UPDATE SET
+                            total = total + excluded.total,
+                            lat_sum = lat_sum + excluded.lat_sum,
+                            errors = errors + excluded.errors,
+                            halluc = halluc + excluded.halluc;
+                    END
+                """)
+                if new_rollup:
+                    # Backfill from history logged before the rollup table existed
+                    conn.execute("""
+                        INSERT INTO daily_stats (day, total, lat_sum, errors, halluc)
+                        SELECT
+                            date(timestamp, 'unixepoch'),
+                            SUM(sample_weight),
+                            SUM(latency_ms * sample_weight),
+                            SUM(CASE WHEN success THEN 0 ELSE sample_weight END),
+                            SUM(unsupported_claims * sample_weight)
+                        FROM request_logs
+                        GROUP BY 1
+                    """)
         except Exception as e:
             logger.error(f"Metrics DB Init Failed: {e}")
 
@@ -77,52 +182,127 @@ class MetricsTracker:
                  unsupported_claims: int = 0,
                  status_code: int = 200,
                  error_type: Optional[str] = None,
-                 tokens: Tuple[int, int] = (0, 0)):
+                 tokens: Tuple[int, int] = (0, 0),
+                 ttft_sec: Optional[float] = None):
         """
         Log a complete query event with full context.
-        Async-safe logging to DB and memory.
+        ttft_sec is the time to first streamed token (streaming requests only).
+        Non-blocking: updates memory and queues the row for the writer thread.
         """
         latency_ms = duration_sec * 1000
+        lat_q = min(int(latency_ms), 65535)  # Window resolution: 1 ms, capped at ~65 s
         now = time.time()
         
-        # 1. Update In-Memory Stats (Thread-safe via deque atomic appends)
-        self.rt_latencies.append(latency_ms)
-        self.rt_failures.append(0 if success else 1)
-        self.rt_ucr_events.append(1 if unsupported_claims > 0 else 0)
+        # 1. Update In-Memory Stats
+        with self._stats_lock:
+            i = self._ring_idx
+            if self._lat_n == self.window_size:
+                evicted = self._lat[i]
+                del self._lat_sorted[bisect_left(self._lat_sorted, evicted)]
+                self._lat_sum -= evicted
+            else:
+                self._lat_n += 1
+            self._lat[i] = lat_q
+            insort(self._lat_sorted, lat_q)
+            self._lat_sum += lat_q
+            
+            fail = 0 if success else 1
+            ucr = 1 if unsupported_claims > 0 else 0
+            self._fail_sum += fail - self._fail_buf[i]
+            self._ucr_sum += ucr - self._ucr_buf[i]
+            self._fail_buf[i] = fail
+            self._ucr_buf[i] = ucr
+            self._ring_idx = (i + 1) % self.window_size
         
         if error_type:
             self.error_counts[error_type] += 1
+            self._errors_dirty = True
             
-        # 2. Persist to DB (Fire and forget style - catch errors)
+        # 2. Persist to DB (queued; written in batches by the writer thread).
+        # Successful requests are sampled; the weight keeps rollups unbiased.
+        if success and self.sample_rate < 1.0:
+            if random.random() >= self.sample_rate:
+                return
+            weight = 1.0 / self.sample_rate
+        else:
+            weight = 1.0
+        ttft_ms = ttft_sec * 1000 if ttft_sec is not None else None
+        self._q.put((now, latency_ms, status_code, success, unsupported_claims, error_type, tokens[0], tokens[1], ttft_ms, weight))
+
+    def _flush_loop(self):
+        """Drain the queue: up to FLUSH_BATCH rows or FLUSH_INTERVAL, whichever comes first."""
+        while True:
+            rows = [self._q.get()]  # Block until there is work
+            deadline = time.monotonic() + self.FLUSH_INTERVAL
+            while len(rows) < self.FLUSH_BATCH:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    rows.append(self._q.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            self._write_rows(rows)
+
+    def _write_rows(self, rows: List[tuple]):
+        """Insert rows in a single transaction (fire and forget - catch errors)."""
         try:
-            with sqlite3.connect(self.db_path) as conn:
-                conn.execute("""
-                    INSERT INTO request_logs 
-                    (timestamp, latency_ms, status_code, success, unsupported_claims, error_type, tokens_in, tokens_out)
-                    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-                """, (now, latency_ms, status_code, success, unsupported_claims, error_type, tokens[0], tokens[1]))
+            with self._db_lock:
+                self._conn.execute("BEGIN")
+                try:
+                    self._conn.executemany(self._INSERT_SQL, rows)
+                    self._conn.execute("COMMIT")
+                except Exception:
+                    self._conn.execute("ROLLBACK")
+                    raise
         except Exception as e:
-            logger.error(f"Failed to persist metric: {e}")
+            logger.error(f"Failed to persist {len(rows)} metrics: {e}")
+
+    def flush(self):
+        """Synchronously write any queued rows (used at exit)."""
+        rows = []
+        while True:
+            try:
+                rows.append(self._q.get_nowait())
+            except queue.Empty:
+                break
+        if rows:
+            self._write_rows(rows)
+
+    def record_llm_usage(self, prompt_tokens: int, completion_tokens: int, cached_tokens: int = 0):
+        """Accumulate token usage reported by the LLM provider."""
+        with self._stats_lock:
+            self.llm_calls += 1
+            self.llm_prompt_tokens += prompt_tokens
+            self.llm_completion_tokens += completion_tokens
+            self.llm_cached_tokens += cached_tokens
+
+    def record_semantic_cache(self, hit: bool):
+        """Count semantic answer-cache lookups and hits."""
+        with self._stats_lock:
+            self.semantic_lookups += 1
+            self.semantic_hits += hit
 
     def get_realtime_stats(self) -> Dict:
         """Get P95 latency, error rates, and UCR from recent window."""
-        if not self.rt_latencies:
+        if not self._lat_n:
             return {
                 "status": "Waiting for traffic...",
                 "samples": 0
             }
             
-        count = len(self.rt_latencies)
-        
-        # Latency Stats
-        sorted_lat = sorted(self.rt_latencies)
-        p50 = sorted_lat[int(count * 0.5)]
-        p95 = sorted_lat[int(count * 0.95)]
-        p99 = sorted_lat[int(count * 0.99)]
-        
-        # Rates
-        fail_rate = (sum(self.rt_failures) / count) * 100
-        ucr_rate = (sum(self.rt_ucr_events) / count) * 100
+        # Latency Stats (window is already sorted; no copy or sort per poll)
+        with self._stats_lock:
+            sorted_lat = self._lat_sorted
+            count = len(sorted_lat)
+            p50 = sorted_lat[int(count * 0.5)]
+            p95 = sorted_lat[int(count * 0.95)]
+            p99 = sorted_lat[int(count * 0.99)]
+            avg = self._lat_sum / count
+            
+            # Rates
+            fail_rate = (self._fail_sum / count) * 100
+            ucr_rate = (self._ucr_sum / count) * 100
         
         return {
             "window_samples": count,
@@ -130,30 +310,48 @@ class MetricsTracker:
                 "p50_ms": round(p50, 2),
                 "p95_ms": round(p95, 2),
                 "p99_ms": round(p99, 2),
-                "avg_ms": round(sum(self.rt_latencies) / count, 2)
+                "avg_ms": round(avg, 2)
             },
             "reliability": {
                 "error_rate_pct": round(fail_rate, 2),
                 "unsupported_claim_rate_pct": round(ucr_rate, 2),
                 "success_rate_pct": round(100 - fail_rate, 2)
             },
-            "top_errors": self.error_counts.most_common(3)
+            "top_errors": self._top_errors(),
+            "llm_usage": {
+                "calls": self.llm_calls,
+                "prompt_tokens": self.llm_prompt_tokens,
+                "completion_tokens": self.llm_completion_tokens,
+                "cached_tokens": self.llm_cached_tokens,
+                "prompt_cache_hit_pct": round(
+                    (self.llm_cached_tokens / self.llm_prompt_tokens) * 100, 2
+                ) if self.llm_prompt_tokens else 0.0
+            },
+            "semantic_cache": {
+                "lookups": self.semantic_lookups,
+                "hits": self.semantic_hits,
+                "hit_rate_pct": round(
+                    (self.semantic_hits / self.semantic_lookups) * 100, 2
+                ) if self.semantic_lookups else 0.0
+            }
         }
 
+    def _top_errors(self) -> List[Tuple[str, int]]:
+        if self._errors_dirty:
+            # Clear first: an error logged mid-recompute re-marks it dirty
+            self._errors_dirty = False
+            self._top_errors_cache = self.error_counts.most_common(3)
+        return self._top_errors_cache
+
     def get_daily_rollup(self, days: int = 7) -> List[Dict]:
         """Generate daily aggregate statistics for reporting."""
         try:
-            with sqlite3.connect(self.db_path) as conn:
-                cursor = conn.execute("""
-                    SELECT 
-                        date(datetime(timestamp, 'unixepoch')) as day,
-                        COUNT(*) as total_reqs,
-                        AVG(latency_ms) as avg_lat,
-                        SUM(CASE WHEN success THEN 0 ELSE 1 END) as errors,
-                        SUM(unsupported_claims) as hallucinations
-                    FROM request_logs
-                    WHERE timestamp > ?
-                    GROUP BY day
+            with self._db_lock:
+                # Reads at most `days` rows from the materialized rollup by primary key
+                cursor = self._conn.execute("""
+                    SELECT day, total, lat_sum / total, errors, halluc
+                    FROM daily_stats
+                    WHERE day >= date(?, 'unixepoch')
                     ORDER BY day DESC
                 """, (time.time() - (days * 86400),))
                 
@@ -161,7 +359,7 @@ class MetricsTracker:
                 return [
                     {
                         "date": r[0],
-                        "requests": r[1],
+                        "requests": round(r[1]),
                         "avg_latency_ms": round(r[2], 2),
                         "error_rate": round((r[3]/r[1])*100, 2),
                         "hallucination_rate": round((r[4]/r[1])*100, 2)
@@ -195,4 +393,4 @@ class MetricsTracker:
         return report
 
 # Global Instance
-metrics = MetricsTracker()
+metrics = MetricsTracker(sample_rate=settings.METRICS_SAMPLE_RATE)
@@ -0,0 +1,80 @@
+"""
+Parent Chunk Store
+~~~~~~~~~~~~~~~~~~
+Doc-store for 'Small-to-Big' retrieval: ParentChildChunker writes each
+parent chunk here once under a parent_id, children carry only that id in
+their vector-store metadata, and the engine swaps retrieved children for
+their parents with one batched lookup. Rows carry their file_id so a
+deleted file's parents can be dropped with its vectors.
+"""
+
+import sqlite3
+import logging
+import threading
+from typing import Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+class ParentStore:
+    """SQLite-backed parent_id -> parent text store (thread-safe)."""
+
+    def __init__(self, db_path: str = "parents.db"):
+        self.db_path = db_path
+        self._conn = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._lock = threading.Lock()
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS parent_chunks (
+                parent_id TEXT PRIMARY KEY,
+                content TEXT,
+                file_id INT
+            )
+        """)
+        # Added with delete_file; migrate older databases in place
+        cols = {row[1] for row in self._conn.execute("PRAGMA table_info(parent_chunks)")}
+        if "file_id" not in cols:
+            self._conn.execute("ALTER TABLE parent_chunks ADD COLUMN file_id INT")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_parent_file ON parent_chunks(file_id)")
+
+    def put_many(self, parents: List[Tuple[str, str]], file_id: Optional[int] = None):
+        """Store (parent_id, content) pairs for one file in one transaction."""
+        if not parents:
+            return
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO parent_chunks (parent_id, content, file_id) VALUES (?, ?, ?)",
+                    [(parent_id, content, file_id) for parent_id, content in parents]
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def get_many(self, parent_ids: Iterable[str]) -> Dict[str, str]:
+        """Fetch parents by id; missing ids are simply absent from the result."""
+        ids = list(dict.fromkeys(parent_ids))
+        if not ids:
+            return {}
+        placeholders = ",".join("?" * len(ids))
+        try:
+            with self._lock:
+                rows = self._conn.execute(
+                    f"SELECT parent_id, content FROM parent_chunks WHERE parent_id IN ({placeholders})",
+                    ids
+                ).fetchall()
+            return dict(rows)
+        except Exception as e:
+            logger.error(f"Parent lookup failed: {e}")
+            return {}
+
+    def delete_file(self, file_id: int) -> int:
+        """Drop every parent stored for file_id; returns the number removed."""
+        with self._lock:
+            cur = self._conn.execute("DELETE FROM parent_chunks WHERE file_id = ?", (file_id,))
+        return cur.rowcount
+
+# Singleton
+parent_store = ParentStore()
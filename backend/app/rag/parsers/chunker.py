@@ -9,45 +9,117 @@ Implements intelligent text splitting that:
 """
 
 from langchain_text_splitters import RecursiveCharacterTextSplitter
-from sentence_transformers import SentenceTransformer, util
+from sentence_transformers import SentenceTransformer
 from typing import List, Dict, Optional
+from functools import lru_cache
 import logging
 import re
+import uuid
 import numpy as np
+import torch
+
+try:
+    import numba
+except ImportError:  # Optional: JIT kernel for CPU-only hosts
+    numba = None
+
+from ..parent_store import parent_store
 
 logger = logging.getLogger(__name__)
 
+# Loaded SentenceTransformer models by name, shared by every chunker instance
+_MODEL_CACHE: Dict[str, SentenceTransformer] = {}
+
+def _get_model(model_name: str) -> SentenceTransformer:
+    model = _MODEL_CACHE.get(model_name)
+    if model is None:
+        # SentenceTransformer picks CUDA itself when available; there, run
+        # inference in FP16 (encode still returns float32 numpy arrays)
+        model = SentenceTransformer(model_name)
+        model.eval()
+        if torch.cuda.is_available():
+            model = model.to('cuda').half()
+        _MODEL_CACHE[model_name] = model
+    return model
+
+# Page marker inserted by pdf_parser: "\n--- Page N ---\n"
+_PAGE_RE = re.compile(r'\n--- Page (\d+) ---\n')
+
+# Explicit separator ladder ending in "" so splitting always terminates
+_SEPARATORS = ["\n\n", "\n", ". ", " ", ""]
+
+def _pair_distances_np(emb: np.ndarray) -> np.ndarray:
+    """Cosine distance between adjacent rows of unit-normalized embeddings."""
+    return 1.0 - np.einsum('ij,ij->i', emb[:-1], emb[1:])
+
+if numba is not None:
+    @numba.njit(cache=True, fastmath=True, parallel=True)
+    def _pair_distances_jit(emb):
+        n = emb.shape[0] - 1
+        out = np.empty(max(n, 0), dtype=emb.dtype)
+        for i in numba.prange(n):
+            dot = 0.0
+            for j in range(emb.shape[1]):
+                dot += emb[i, j] * emb[i + 1, j]
+            out[i] = 1.0 - dot
+        return out
+
+def _pair_distances(emb: np.ndarray) -> np.ndarray:
+    # Without CUDA the chunker is CPU-bound end to end; use the numba kernel
+    # there when numba is installed, numpy otherwise
+    if numba is not None and not torch.cuda.is_available():
+        return _pair_distances_jit(np.ascontiguousarray(emb))
+    return _pair_distances_np(emb)
+
+# Sentence boundary: whitespace after . ? ! when a capital letter follows
+_SENT_SPLIT_RE = re.compile(r'(?<=[.?!])\s+(?=[A-Z])')
+
+_CORE_KEYWORDS = ('abstract', 'conclusion', 'summary', 'key finding', 'contribution',
+                  'main result', 'we propose', 'we present', 'novel', 'state-of-the-art')
+_METHOD_KEYWORDS = ('method', 'approach', 'algorithm', 'implementation', 'architecture',
+                    'procedure', 'technique', 'design', 'model')
+_EXP_KEYWORDS = ('experiment', 'result', 'evaluation', 'dataset', 'benchmark',
+                 'accuracy', 'performance', 'table', 'figure', 'ablation')
+
+@lru_cache(maxsize=256)
+def _heading_importance(heading_lower: str) -> Optional[str]:
+    """Importance implied by a section heading alone, or None."""
+    if any(kw in heading_lower for kw in ('abstract', 'conclusion', 'summary')):
+        return 'core_contribution'
+    if any(kw in heading_lower for kw in ('method', 'approach', 'algorithm')):
+        return 'methodology'
+    if any(kw in heading_lower for kw in ('result', 'experiment', 'evaluation')):
+        return 'experiment'
+    return None
+
 def classify_importance(text: str, section_heading: str = "") -> str:
     """
     Classify chunk importance based on content and section heuristics.
     
     Returns: 'core_contribution', 'methodology', 'experiment', or 'background'
     """
+    # Heading rules take precedence; a heading is shared by every child chunk
+    # of a section, so its result is memoized
+    heading_class = _heading_importance(section_heading.lower()) if section_heading else None
+    
     text_lower = text.lower()
-    heading_lower = section_heading.lower() if section_heading else ""
     
     # Core Contribution: Abstract, Conclusion, Main findings
-    core_keywords = ['abstract', 'conclusion', 'summary', 'key finding', 'contribution', 
-                     'main result', 'we propose', 'we present', 'novel', 'state-of-the-art']
-    if any(kw in heading_lower for kw in ['abstract', 'conclusion', 'summary']):
-        return 'core_contribution'
-    if any(kw in text_lower[:500] for kw in core_keywords):
+    if heading_class == 'core_contribution':
+        return heading_class
+    if any(kw in text_lower[:500] for kw in _CORE_KEYWORDS):
         return 'core_contribution'
     
     # Methodology: Methods, Approach, Algorithm
-    method_keywords = ['method', 'approach', 'algorithm', 'implementation', 'architecture',
-                       'procedure', 'technique', 'design', 'model']
-    if any(kw in heading_lower for kw in ['method', 'approach', 'algorithm']):
-        return 'methodology'
-    if any(kw in text_lower for kw in method_keywords):
+    if heading_class == 'methodology':
+        return heading_class
+    if any(kw in text_lower for kw in _METHOD_KEYWORDS):
         return 'methodology'
     
     # Experiment: Results, Evaluation, Data
-    exp_keywords = ['experiment', 'result', 'evaluation', 'dataset', 'benchmark', 
-                    'accuracy', 'performance', 'table', 'figure', 'ablation']
-    if any(kw in heading_lower for kw in ['result', 'experiment', 'evaluation']):
-        return 'experiment'
-    if any(kw in text_lower for kw in exp_keywords):
+    if heading_class == 'experiment':
+        return heading_class
+    if any(kw in text_lower for kw in _EXP_KEYWORDS):
         return 'experiment'
     
     # Default: Background
@@ -75,10 +147,12 @@ class SemanticChunker:
             buffer_size: Number of sentences to look ahead/behind for context
         """
         try:
-            self.model = SentenceTransformer(model_name)
+            self.model = _get_model(model_name)
+            self._device = str(self.model.device)
         except Exception as e:
             logger.error(f"Failed to load embedding model: {e}")
             self.model = None
+            self._device = None
             
         self.breakpoint_percentile_threshold = breakpoint_percentile_threshold
         self.buffer_size = buffer_size
@@ -86,34 +160,35 @@ class SemanticChunker:
         
         # Fallback splitter
         self.fallback_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=1000, chunk_overlap=200
+            chunk_size=1000, chunk_overlap=200,
+            separators=_SEPARATORS, length_function=len, is_separator_regex=False
         )
 
     def _split_into_sentences(self, text: str) -> List[str]:
         # Simple robust sentence splitting
-        # Look for periods, question marks, exclamations followed by space and capital letter
-        sentences = re.split(r'(?<=[.?!])\s+(?=[A-Z])', text)
-        return [s.strip() for s in sentences if s.strip()]
-
-    def _combine_sentences(self, sentences: List[dict], buffer_size: int = 1) -> List[dict]:
-        # Add window context to sentences for better embedding representation
-        for i in range(len(sentences)):
-            combined_text = ""
-            # Add previous sentences
-            for j in range(i - buffer_size, i):
-                if j >= 0:
-                    combined_text += sentences[j]['sentence'] + " "
-            
-            combined_text += sentences[i]['sentence']
-            
-            # Add next sentences
-            for j in range(i + 1, i + 1 + buffer_size):
-                if j < len(sentences):
-                    combined_text += " " + sentences[j]['sentence']
-            
-            sentences[i]['combined_sentence'] = combined_text
+        # Look for periods, question marks, exclamations followed by space and capital letter.
+        # Walk boundary positions and slice once per sentence (no intermediate split list)
+        sentences = []
+        start = 0
+        for m in _SENT_SPLIT_RE.finditer(text):
+            sentence = text[start:m.start()].strip()
+            if sentence:
+                sentences.append(sentence)
+            start = m.end()
+        sentence = text[start:].strip()
+        if sentence:
+            sentences.append(sentence)
         return sentences
 
+    def _combine_sentences(self, sentences: List[str], buffer_size: int = 1) -> List[str]:
+        # Add window context to sentences for better embedding representation:
+        # previous buffer_size sentences, the sentence, next buffer_size sentences.
+        # Returns a list parallel to sentences.
+        return [
+            " ".join(sentences[max(0, i - buffer_size):i + buffer_size + 1])
+            for i in range(len(sentences))
+        ]
+
     def chunk_text(self, text: str, metadata: Optional[Dict] = None) -> List[Dict]:
         """
         Chunk using semantic analysis.
@@ -126,45 +201,46 @@ class SemanticChunker:
         if not text or not text.strip():
             return []
             
-        # 0. Handle Page Markers (Recursive Strategy)
+        # 0. Handle Page Markers
         # pdf_parser inserts "\n--- Page X ---\n". We use this to assign page numbers.
-        page_pattern = r'\n--- Page (\d+) ---\n'
-        # Check if text contains page markers
-        if re.search(page_pattern, text):
-            parts = re.split(page_pattern, text)
-            # parts structure: [preamble, page_num_1, content_1, page_num_2, content_2, ...]
-            
-            all_chunks = []
+        # Substring gate first; then one finditer pass yields every page boundary.
+        markers = list(_PAGE_RE.finditer(text)) if "\n--- Page " in text else None
+        if not markers:
+            return self._chunk_core(text, metadata)
+        
+        all_chunks = []
+    
+        # Handle preamble (text before first page marker)
+        preamble = text[:markers[0].start()]
+        if preamble.strip():
+            # Treat as Page 1 or metadata default
+            all_chunks.extend(self._chunk_core(preamble, metadata))
+        
+        # Page content runs from the end of its marker to the start of the next
+        ends = [m.start() for m in markers[1:]] + [len(text)]
+        for m, end in zip(markers, ends):
+            try:
+                page_num = int(m.group(1))
+                page_content = text[m.end():end]
             
-            # Handle preamble (text before first page marker)
-            if parts[0].strip():
-                # Treat as Page 1 or metadata default
-                # We'll just recurse with existing metadata
-                all_chunks.extend(self.chunk_text(parts[0], metadata))
-                
-            # Iterate over page number/content pairs
-            for i in range(1, len(parts), 2):
-                try:
-                    page_num = int(parts[i])
-                    page_content = parts[i+1]
-                    
-                    if not page_content.strip():
-                        continue
-                        
-                    # Update metadata for this page
-                    page_metadata = (metadata or {}).copy()
-                    page_metadata["page_number"] = page_num
-                    
-                    # Recurse: Chunk this page's content
-                    # Since markers are removed, the recursive call will hit the core logic below
-                    page_chunks = self.chunk_text(page_content, page_metadata)
-                    all_chunks.extend(page_chunks)
-                except Exception as e:
-                    logger.warning(f"Error processing page split: {e}")
+                if not page_content.strip():
                     continue
-                    
-            return all_chunks
+                
+                # Update metadata for this page
+                page_metadata = (metadata or {}).copy()
+                page_metadata["page_number"] = page_num
+            
+                # Chunk this page's content (markers already removed)
+                page_chunks = self._chunk_core(page_content, page_metadata)
+                all_chunks.extend(page_chunks)
+            except Exception as e:
+                logger.warning(f"Error processing page split: {e}")
+                continue
+            
+        return all_chunks
 
+    def _chunk_core(self, text: str, metadata: Optional[Dict]) -> List[Dict]:
+        """Semantic chunking of text that contains no page markers."""
         # Fallback if model failed to load
         if not self.model:
             logger.warning("Semantic chunking model not loaded, using fallback.")
@@ -172,70 +248,65 @@ class SemanticChunker:
             return [{"content": c, "metadata": metadata or {}} for c in chunks]
 
         # 1. Split sentences
-        single_sentences_list = self._split_into_sentences(text)
-        if len(single_sentences_list) < 2:
+        # Sentences stay a plain list of str; windows and groups are list slices
+        sentences = self._split_into_sentences(text)
+        if len(sentences) < 2:
              return [{"content": text, "metadata": metadata or {}}]
-             
-        sentences = [{'sentence': x, 'index': i} for i, x in enumerate(single_sentences_list)]
         
         # 2. Add Context Buffer & Embed
-        sentences = self._combine_sentences(sentences, self.buffer_size)
-        embeddings = self.model.encode([x['combined_sentence'] for x in sentences])
+        combined_sentences = self._combine_sentences(sentences, self.buffer_size)
+        embeddings = self.model.encode(
+            combined_sentences,
+            batch_size=64,
+            device=self._device,
+            convert_to_numpy=True,
+            normalize_embeddings=True,
+            show_progress_bar=False
+        )
         
         # 3. Calculate Cosine Distances
-        distances = []
-        for i in range(len(embeddings) - 1):
-            sim = util.pytorch_cos_sim(embeddings[i], embeddings[i+1]).item()
-            distance = 1 - sim
-            distances.append(distance)
+        # Embeddings are unit-normalized, so adjacent cosine similarity is a row-wise dot product
+        distances = _pair_distances(embeddings)
             
         # 4. Determine Threshold
         # value at the Xth percentile (e.g. 95th percentile of distances = top 5% most different)
         # Any distance higher than this is a breakpoint.
-        if not distances:
+        if not len(distances):
             breakpoint_distance_threshold = 0
         else:
-            breakpoint_distance_threshold = np.percentile(distances, self.breakpoint_percentile_threshold)
+            # Same value as np.percentile's linear interpolation, from one
+            # introselect over the two neighbouring ranks
+            rank = self.breakpoint_percentile_threshold / 100.0 * (len(distances) - 1)
+            lo = int(rank)
+            hi = min(lo + 1, len(distances) - 1)
+            part = np.partition(distances, (lo, hi))
+            breakpoint_distance_threshold = part[lo] + (part[hi] - part[lo]) * (rank - lo)
             
         # 5. Group Chunks
-        indices_above_thresh = [i for i, x in enumerate(distances) if x > breakpoint_distance_threshold]
+        indices_above_thresh = np.nonzero(distances > breakpoint_distance_threshold)[0].tolist()
         
-        chunks = []
-        start_index = 0
-        
-        # Iterate through breakpoints
-        for index in indices_above_thresh:
-            # The split happens AFTER the sentence at 'index'
-            end_index = index + 1 # exclusive because list slicing is exclusive
-            
-            group = sentences[start_index:end_index]
-            combined_text = " ".join([d['sentence'] for d in group])
-            chunks.append(combined_text)
-            start_index = end_index
-            
-        # Add the last chunk
-        if start_index < len(sentences):
-            group = sentences[start_index:]
-            combined_text = " ".join([d['sentence'] for d in group])
-            chunks.append(combined_text)
+        # Chunk boundaries: a split happens AFTER the sentence at each breakpoint
+        # index; each chunk is one join over a slice of the stripped sentences
+        bounds = [0, *(i + 1 for i in indices_above_thresh), len(sentences)]
+        chunks = [" ".join(sentences[a:b]) for a, b in zip(bounds, bounds[1:])]
             
         # Format for return
-        enriched_chunks = []
         total_chunks = len(chunks)
-        
-        for idx, chunk_text in enumerate(chunks):
-            chunk_metadata = {
-                "chunk_index": idx,
-                "total_chunks": total_chunks,
-                "chunk_method": "semantic",
-                **(metadata or {})
-            }
-            enriched_chunks.append({
+        base_metadata = metadata or {}
+        enriched_chunks = [
+            {
                 "content": chunk_text,
-                "metadata": chunk_metadata
-            })
+                "metadata": {
+                    "chunk_index": idx,
+                    "total_chunks": total_chunks,
+                    "chunk_method": "semantic",
+                    **base_metadata
+                }
+            }
+            for idx, chunk_text in enumerate(chunks)
+        ]
             
-        logger.info(f"Semantic Chunking: {len(text)} chars -> {len(single_sentences_list)} sentences -> {total_chunks} chunks")
+        logger.info(f"Semantic Chunking: {len(text)} chars -> {len(sentences)} sentences -> {total_chunks} chunks")
         return enriched_chunks
 
 # ... (SemanticChunker class remains above)
@@ -246,18 +317,25 @@ class ParentChildChunker:
     
     1. Splits text into large 'Parent' chunks (e.g., 1024-2048 chars) for full context.
     2. Splits each Parent into small 'Child' chunks (e.g., 256-512 chars) for precise retrieval.
-    3. Child chunks store the Parent's content in metadata.
+    3. Parents are written once to parent_store; child chunks carry only the parent_id.
     """
     
     def __init__(self, parent_chunk_size=1024, child_chunk_size=256, chunk_overlap=0):
         self.parent_splitter = RecursiveCharacterTextSplitter(
             chunk_size=parent_chunk_size, 
-            chunk_overlap=chunk_overlap
+            chunk_overlap=chunk_overlap,
+            separators=_SEPARATORS,
+            length_function=len,
+            is_separator_regex=False
         )
         self.child_splitter = RecursiveCharacterTextSplitter(
             chunk_size=child_chunk_size, 
-            chunk_overlap=chunk_overlap
+            chunk_overlap=chunk_overlap,
+            separators=_SEPARATORS,
+            length_function=len,
+            is_separator_regex=False
         )
+        self.child_chunk_size = child_chunk_size
         self.semantic_chunker = SemanticChunker() # Use semantic for finding good parents?
         
     def chunk_text(self, text: str, metadata: Optional[Dict] = None) -> List[Dict]:
@@ -265,14 +343,21 @@ class ParentChildChunker:
             return []
             
         # 1. Create Parent Chunks (Legacy: fixed size, Future: Semantic Parents)
-        # Using Semantic Chunker for Parents ensures parents are topic-coherent
-        parents = self.semantic_chunker.chunk_text(text, metadata)
+        # Using Semantic Chunker for Parents ensures parents are topic-coherent.
+        # Short text without page markers is a single parent: skip the embedding pass.
+        if len(text) <= self.child_chunk_size * 2 and "\n--- Page " not in text:
+            parents = [{"content": text, "metadata": metadata or {}}]
+        else:
+            parents = self.semantic_chunker.chunk_text(text, metadata)
         
         all_children = []
+        parent_rows = []
         
         for p_idx, parent in enumerate(parents):
             parent_text = parent["content"]
             parent_meta = parent["metadata"]
+            parent_id = uuid.uuid4().hex
+            parent_rows.append((parent_id, parent_text))
             
             # 2. Create Child Chunks from this Parent
             children_texts = self.child_splitter.split_text(parent_text)
@@ -284,7 +369,7 @@ class ParentChildChunker:
                 
                 child_meta = parent_meta.copy()
                 child_meta.update({
-                    "parent_content": parent_text,  # The "Big" chunk
+                    "parent_id": parent_id,  # The "Big" chunk, in parent_store
                     "is_child": True,
                     "parent_index": p_idx,
                     "child_index": c_idx,
@@ -297,6 +382,7 @@ class ParentChildChunker:
                     "metadata": child_meta
                 })
         
+        parent_store.put_many(parent_rows, file_id=(metadata or {}).get("file_id"))
         logger.info(f"Parent-Child Chunking: {len(parents)} parents -> {len(all_children)} children")
         return all_children
 
@@ -13,15 +13,22 @@ This is the CORRECT way to handle page citations:
 Total: 250+ lines
 """
 
+import re
 import logging
-from typing import List, Dict, Optional, Tuple
+from typing import List, Dict, Iterator, Optional, Tuple
 from dataclasses import dataclass
 from pathlib import Path
 import fitz  # PyMuPDF
-from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+from .page_pool import default_workers, extract_pages_parallel, use_parallel
+from .pdf_cache import opened_pdf
+from .text_splitter import SplitMergeChunker
 
 logger = logging.getLogger(__name__)
 
+# Page-text whitespace collapse, compiled once
+_WS_RE = re.compile(r'\s+')
+
 @dataclass
 class PageExtraction:
     """Represents text extracted from a single page"""
@@ -29,9 +36,9 @@ class PageExtraction:
     text: str
     section: Optional[str] = None  # Detected section name
 
-@dataclass
+@dataclass(slots=True)
 class AcademicChunk:
-    """Chunk with page metadata"""
+    """Chunk with page metadata (slotted: no per-instance dict)"""
     text: str
     page_start: int
     page_end: int
@@ -39,6 +46,20 @@ class AcademicChunk:
     importance: str
     file_id: int
     chunk_index: int
+    user_id: int = 0
+    
+    def metadata(self) -> Dict:
+        """Vector-DB metadata dict; built only when the chunk is stored"""
+        return {
+            "file_id": self.file_id,
+            "user_id": self.user_id,
+            "chunk_index": self.chunk_index,
+            "page_start": self.page_start,
+            "page_end": self.page_end,
+            "section": self.section,
+            "importance": self.importance,
+            "source": "page_aware_parser"
+        }
 
 class PageAwarePDFParser:
     """
@@ -68,34 +89,43 @@ class PageAwarePDFParser:
         (r'^references?\s*$', 'References'),
     ]
     
-    def __init__(self, chunk_size: int = 2000, chunk_overlap: int = 200):
+    # All section patterns as one case-insensitive alternation; group g{i}
+    # is SECTION_PATTERNS[i], tried in list order
+    _SECTION_RE = re.compile(
+        "|".join(
+            f"(?P<g{i}>{re.sub(r'[(](?![?])', '(?:', pat)})"
+            for i, (pat, _) in enumerate(SECTION_PATTERNS)
+        ),
+        re.IGNORECASE
+    )
+    _SECTION_NAMES = [name for _, name in SECTION_PATTERNS]
+    
+    def __init__(
+        self,
+        chunk_size: int = 2000,
+        chunk_overlap: int = 200,
+        workers: Optional[int] = None,
+        cache_pdf: bool = True
+    ):
         self.chunk_size = chunk_size
         self.chunk_overlap = chunk_overlap
-        self.splitter = RecursiveCharacterTextSplitter(
-            chunk_size=chunk_size,
-            chunk_overlap=chunk_overlap,
-            separators=["\n\n", "\n", ". ", " ", ""]
-        )
+        self.workers = workers or default_workers()  # Page-extraction processes
+        self.cache_pdf = cache_pdf  # False for one-shot parses (see pdf_cache)
+        self.splitter = SplitMergeChunker(chunk_size, chunk_overlap)
     
-    def parse(self, pdf_path: str, file_id: int, user_id: int) -> List[Dict]:
+    def parse(self, pdf_path: str, file_id: int, user_id: int) -> List[AcademicChunk]:
         """
         Main entry point for parsing.
         
         Returns:
             List of chunks with page metadata ready for vector DB
+            (materialized here because results are returned across processes)
         """
         logger.info(f"Parsing PDF with page tracking: {pdf_path}")
         
         try:
-            # Step 1: Extract pages
-            pages = self._extract_pages(pdf_path)
-            logger.info(f"Extracted {len(pages)} pages")
-            
-            # Step 2: Detect sections
-            pages_with_sections = self._detect_sections_per_page(pages)
-            
-            # Step 3: Chunk with page metadata
-            chunks = self._chunk_with_pages(pages_with_sections, file_id, user_id)
+            # Single pass: extract -> detect section -> chunk, per page
+            chunks = list(self._parse_pipeline(pdf_path, file_id, user_id))
             logger.info(f"Created {len(chunks)} chunks")
             
             return chunks
@@ -104,139 +134,116 @@ class PageAwarePDFParser:
             logger.error(f"PDF parsing failed: {e}", exc_info=True)
             return []
     
-    def _extract_pages(self, pdf_path: str) -> List[PageExtraction]:
+    def _extract_pages(self, pdf_path: str) -> Iterator[PageExtraction]:
         """
-        Extract text page-by-page using PyMuPDF.
+        Extract text page-by-page using PyMuPDF, yielding pages as they are read.
         
         This is CRITICAL: we must loop per page, not per document.
         """
-        pages = []
+        yielded = 0
         
         try:
-            doc = fitz.open(pdf_path)
-            
-            for page_num, page in enumerate(doc, start=1):
-                # Extract text
-                text = page.get_text()
-                
-                # Clean text
-                text = self._clean_text(text)
+            with opened_pdf(pdf_path, keep=self.cache_pdf) as doc:
+                n_pages = doc.page_count
+                if use_parallel(n_pages, self.workers):
+                    extracted = extract_pages_parallel(
+                        fitz.open, _page_text, pdf_path, n_pages, self.workers
+                    )
+                else:
+                    extracted = (
+                        (page_num, self._clean_text(page.get_text()))
+                        for page_num, page in enumerate(doc, start=1)
+                    )
                 
-                if text.strip():
-                    pages.append(PageExtraction(
-                        page_num=page_num,
-                        text=text
-                    ))
-            
-            doc.close()
+                for page_num, text in extracted:
+                    if text.strip():
+                        yielded += 1
+                        yield PageExtraction(
+                            page_num=page_num,
+                            text=text
+                        )
             
         except Exception as e:
             logger.error(f"PyMuPDF extraction failed: {e}")
+            if yielded:
+                raise  # Pages already handed downstream; can't restart cleanly
             # Fallback to pdfplumber if PyMuPDF fails
-            pages = self._fallback_extraction(pdf_path)
-        
-        return pages
+            yield from self._fallback_extraction(pdf_path)
     
-    def _fallback_extraction(self, pdf_path: str) -> List[PageExtraction]:
+    def _fallback_extraction(self, pdf_path: str) -> Iterator[PageExtraction]:
         """Fallback to pdfplumber if PyMuPDF fails"""
         import pdfplumber
-        pages = []
         
         try:
             with pdfplumber.open(pdf_path) as pdf:
                 for page_num, page in enumerate(pdf.pages, start=1):
                     text = page.extract_text()
                     if text:
-                        pages.append(PageExtraction(
+                        yield PageExtraction(
                             page_num=page_num,
                             text=self._clean_text(text)
-                        ))
+                        )
         except Exception as e:
             logger.error(f"Fallback extraction also failed: {e}")
-        
-        return pages
     
-    def _clean_text(self, text: str) -> str:
+    @staticmethod
+    def _clean_text(text: str) -> str:
         """Remove noise"""
-        import re
+        # Remove standalone page numbers (must run while lines still exist)
+        text = '\n'.join(line for line in text.split('\n') if not line.strip().isdecimal())
         # Remove excessive whitespace
-        text = re.sub(r'\s+', ' ', text)
-        # Remove standalone page numbers
-        text = re.sub(r'^\s*\d+\s*$', '', text, flags=re.MULTILINE)
+        text = _WS_RE.sub(' ', text)
         return text.strip()
     
-    def _detect_sections_per_page(self, pages: List[PageExtraction]) -> List[PageExtraction]:
+    def _detect_section(self, text: str) -> Optional[str]:
         """
-        Detect which section each page belongs to.
+        Section started on this page, if any.
         
-        Strategy: Scan for section headers, track current section
+        Strategy: Scan the first lines for section headers; the last match wins
         """
-        import re
-        current_section = "General"
-        
-        for page in pages:
-            # Check if this page starts a new section
-            lines = page.text.split('\n')
-            for line in lines[:10]:  # Check first 10 lines
-                line_clean = line.strip().lower()
-                if len(line_clean) > 100:  # Too long to be a header
-                    continue
-                
-                for pattern, section_name in self.SECTION_PATTERNS:
-                    if re.match(pattern, line_clean):
-                        current_section = section_name
-                        logger.debug(f"Page {page.page_num}: Section = {section_name}")
-                        break
+        section = None
+        for line in _head_lines(text, 10):  # Check first 10 lines
+            line_clean = line.strip()
+            if len(line_clean) > 100:  # Too long to be a header
+                continue
             
-            page.section = current_section
-        
-        return pages
+            m = self._SECTION_RE.match(line_clean)
+            if m:
+                section = self._SECTION_NAMES[int(m.lastgroup[1:])]
+        return section
     
-    def _chunk_with_pages(
-        self, 
-        pages: List[PageExtraction], 
-        file_id: int, 
-        user_id: int
-    ) -> List[Dict]:
+    def _parse_pipeline(self, pdf_path: str, file_id: int, user_id: int) -> Iterator[AcademicChunk]:
         """
-        Chunk text while preserving page information.
+        Extract, sectionize and chunk in one traversal of the pages.
         
-        CRITICAL: Each chunk must know its page range.
+        CRITICAL: Each chunk must know its page range. Pages are grouped by
+        section for better chunk boundaries; only the current section's pages
+        are held, and they are chunked as soon as the section changes.
         """
-        chunks = []
+        current_section = "General"
+        section_pages: List[PageExtraction] = []
         chunk_index = 0
         
-        # Process pages in groups by section for better chunk boundaries
-        current_section_pages = []
-        current_section = None
-        
-        for page in pages:
-            if page.section != current_section and current_section_pages:
+        for page in self._extract_pages(pdf_path):
+            # Check if this page starts a new section
+            section = self._detect_section(page.text)
+            if section:
+                current_section = section
+                logger.debug(f"Page {page.page_num}: Section = {current_section}")
+            
+            if section_pages and section_pages[-1].section != current_section:
                 # Section changed, flush accumulated pages
-                section_chunks = self._chunk_section(
-                    current_section_pages, 
-                    file_id, 
-                    user_id, 
-                    chunk_index
-                )
-                chunks.extend(section_chunks)
-                chunk_index += len(section_chunks)
-                current_section_pages = []
+                for chunk in self._chunk_section(section_pages, file_id, user_id, chunk_index):
+                    chunk_index += 1
+                    yield chunk
+                section_pages = []
             
-            current_section = page.section
-            current_section_pages.append(page)
+            page.section = current_section
+            section_pages.append(page)
         
         # Flush final section
-        if current_section_pages:
-            section_chunks = self._chunk_section(
-                current_section_pages, 
-                file_id, 
-                user_id, 
-                chunk_index
-            )
-            chunks.extend(section_chunks)
-        
-        return chunks
+        if section_pages:
+            yield from self._chunk_section(section_pages, file_id, user_id, chunk_index)
     
     def _chunk_section(
         self, 
@@ -244,7 +251,7 @@ class PageAwarePDFParser:
         file_id: int, 
         user_id: int, 
         start_index: int
-    ) -> List[Dict]:
+    ) -> Iterator[AcademicChunk]:
         """
         Chunk a group of pages from same section.
         """
@@ -259,21 +266,17 @@ class PageAwarePDFParser:
         # Classify importance
         importance = self._classify_importance(section_name)
         
-        # Split into chunks
+        # Split into chunks; the splitter reports each chunk's offsets in full_text
         if len(full_text) > self.chunk_size:
-            text_chunks = self.splitter.split_text(full_text)
+            text_chunks = self.splitter.chunks(full_text)
         else:
-            text_chunks = [full_text]
+            text_chunks = [(full_text, 0, len(full_text))]
         
         # Build chunk objects
-        chunks = []
-        for idx, text_chunk in enumerate(text_chunks):
+        # Simple heuristic: distribute pages across chunks by character offset
+        chars_per_page = len(full_text) / len(section_pages)
+        for idx, (text_chunk, chunk_start_char, chunk_end_char) in enumerate(text_chunks):
             # Calculate page range for this chunk
-            # Simple heuristic: distribute pages across chunks
-            chars_per_page = len(full_text) / len(section_pages)
-            chunk_start_char = sum(len(text_chunks[i]) for i in range(idx))
-            chunk_end_char = chunk_start_char + len(text_chunk)
-            
             chunk_page_start = page_start + int(chunk_start_char / chars_per_page)
             chunk_page_end = page_start + int(chunk_end_char / chars_per_page)
             
@@ -281,21 +284,16 @@ class PageAwarePDFParser:
             chunk_page_start = max(page_start, min(chunk_page_start, page_end))
             chunk_page_end = max(page_start, min(chunk_page_end, page_end))
             
-            chunks.append({
-                "text": text_chunk,
-                "metadata": {
-                    "file_id": file_id,
-                    "user_id": user_id,
-                    "chunk_index": start_index + idx,
-                    "page_start": chunk_page_start,
-                    "page_end": chunk_page_end,
-                    "section": section_name,
-                    "importance": importance,
-                    "source": "page_aware_parser"
-                }
-            })
-        
-        return chunks
+            yield AcademicChunk(
+                text=text_chunk,
+                page_start=chunk_page_start,
+                page_end=chunk_page_end,
+                section=section_name,
+                importance=importance,
+                file_id=file_id,
+                chunk_index=start_index + idx,
+                user_id=user_id
+            )
     
     def _classify_importance(self, section: str) -> str:
         """Classify section importance"""
@@ -311,8 +309,31 @@ class PageAwarePDFParser:
             return 'general'
 
 
+def _head_lines(text: str, n: int) -> Iterator[str]:
+    """First n lines of text, without splitting the rest of the page."""
+    start = 0
+    for _ in range(n):
+        end = text.find('\n', start)
+        if end < 0:
+            yield text[start:]
+            return
+        yield text[start:end]
+        start = end + 1
+
+
+def _page_text(doc: "fitz.Document", i: int) -> str:
+    """Page-pool worker: cleaned text of 0-based page i."""
+    return PageAwarePDFParser._clean_text(doc.load_page(i).get_text())
+
+
 # Convenience function
-def parse_pdf_with_pages(pdf_path: str, file_id: int, user_id: int) -> List[Dict]:
+def parse_pdf_with_pages(
+    pdf_path: str,
+    file_id: int,
+    user_id: int,
+    workers: Optional[int] = None,
+    cache_pdf: bool = True
+) -> List[AcademicChunk]:
     """Parse PDF and return chunks with page metadata"""
-    parser = PageAwarePDFParser()
+    parser = PageAwarePDFParser(workers=workers, cache_pdf=cache_pdf)
     return parser.parse(pdf_path, file_id, user_id)
@@ -0,0 +1,86 @@
+"""
+Shared Page-Extraction Pool
+~~~~~~~~~~~~~~~~~~~~~~~~~~~
+One process pool for per-page PDF text extraction, used by every parser.
+
+fitz documents and pdfplumber pages are neither thread-safe nor picklable,
+so each worker reopens the file and extracts a contiguous page range.
+The pool is created on first use (per process) and shut down at exit.
+
+Code already running inside a pool worker (e.g. IngestionManager's parse
+processes) should pass workers=1 to the parsers: nesting pools would start
+cpu_count processes per worker.
+"""
+
+import os
+import atexit
+import logging
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Below this many pages the hand-off to workers costs more than it saves
+PARALLEL_MIN_PAGES = 16
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_pid: Optional[int] = None
+_pool_lock = threading.Lock()
+
+
+def default_workers() -> int:
+    return os.cpu_count() or 1
+
+
+def use_parallel(n_pages: int, workers: int) -> bool:
+    """Whether a document of n_pages is worth splitting across workers."""
+    return workers > 1 and n_pages >= PARALLEL_MIN_PAGES
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool, _pool_pid
+    with _pool_lock:
+        # A forked child inherits the parent's executor object but not its
+        # worker processes; it needs a pool of its own
+        if _pool is None or _pool_pid != os.getpid():
+            _pool = ProcessPoolExecutor(max_workers=default_workers())
+            _pool_pid = os.getpid()
+        return _pool
+
+
+@atexit.register
+def _shutdown_pool():
+    with _pool_lock:
+        if _pool is not None and _pool_pid == os.getpid():
+            _pool.shutdown(wait=False, cancel_futures=True)
+
+
+def _extract_range(
+    open_pdf: Callable, page_text: Callable, pdf_path: str, start: int, stop: int
+) -> List[Tuple[int, str]]:
+    """Worker: page_text(doc, i) for 0-based pages [start, stop) as (page_num, text)."""
+    with open_pdf(pdf_path) as doc:
+        return [(i + 1, page_text(doc, i)) for i in range(start, stop)]
+
+
+def extract_pages_parallel(
+    open_pdf: Callable,
+    page_text: Callable,
+    pdf_path: str,
+    n_pages: int,
+    workers: int
+) -> Iterator[Tuple[int, str]]:
+    """
+    Yield (page_num, text) for every page, in page order, from the shared pool.
+    open_pdf and page_text must be module-level (picklable) callables.
+    """
+    pool = _get_pool()
+    step = -(-n_pages // workers)  # Ceil: one range per worker
+    futures = [
+        pool.submit(_extract_range, open_pdf, page_text, pdf_path, start, min(start + step, n_pages))
+        for start in range(0, n_pages, step)
+    ]
+    # Futures are submitted in page order
+    for f in futures:
+        yield from f.result()
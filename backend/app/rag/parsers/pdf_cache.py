@@ -0,0 +1,131 @@
+"""
+Opened-PDF Cache
+~~~~~~~~~~~~~~~~
+Small LRU of open fitz.Documents so the parsers that touch the same file
+(text, tables, page-aware chunking) share one MuPDF parse instead of each
+calling fitz.open.
+
+Keyed on (path, mtime, size) so a rewritten file is reopened. Files up to
+STREAM_MAX_BYTES are read into memory once and opened from the byte
+stream, so repeated passes don't go back to the filesystem. Evicted
+documents are closed, deferred until the last `opened_pdf` user exits.
+fitz documents are not thread-safe: each entry's lock serializes its users.
+
+One-shot readers (e.g. ingestion workers, which parse each file once) pass
+keep=False: they reuse a cached copy if there is one, but otherwise open
+the file directly and close it when done instead of filling the cache.
+"""
+
+import os
+import logging
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Iterator, Tuple
+
+import fitz  # PyMuPDF
+
+logger = logging.getLogger(__name__)
+
+MAX_OPEN_DOCS = 4
+# Larger (e.g. scanned) PDFs stay file-backed to bound RAM
+STREAM_MAX_BYTES = 50 * 1024 * 1024
+
+
+class _Entry:
+    __slots__ = ("doc", "lock", "users", "evicted")
+
+    def __init__(self, doc: "fitz.Document"):
+        self.doc = doc
+        self.lock = threading.RLock()
+        self.users = 0
+        self.evicted = False
+
+
+class PDFDocumentCache:
+    """Bounded LRU of open PyMuPDF documents."""
+
+    def __init__(self, max_docs: int = MAX_OPEN_DOCS):
+        self.max_docs = max_docs
+        self._entries: "OrderedDict[Tuple[str, float, int], _Entry]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(path: str) -> Tuple[str, float, int]:
+        st = os.stat(path)
+        return (os.path.abspath(path), st.st_mtime, st.st_size)
+
+    def _acquire(self, path: str, keep: bool) -> _Entry:
+        key = self._key(path)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                entry.users += 1
+                return entry
+        
+        # Disk read and MuPDF parse happen outside the cache lock, so other
+        # callers aren't serialized behind this file's I/O
+        doc = self._open(path, stream=keep and key[2] <= STREAM_MAX_BYTES)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                # Opened concurrently by another caller; share theirs
+                doc.close()
+                self._entries.move_to_end(key)
+            else:
+                entry = _Entry(doc)
+                if keep:
+                    self._entries[key] = entry
+                    while len(self._entries) > self.max_docs:
+                        _, old = self._entries.popitem(last=False)
+                        self._retire(old)
+                else:
+                    entry.evicted = True  # Uncached: closed on release
+            entry.users += 1
+            return entry
+
+    def _release(self, entry: _Entry):
+        with self._lock:
+            entry.users -= 1
+            if entry.evicted and entry.users == 0:
+                entry.doc.close()
+
+    @staticmethod
+    def _open(path: str, stream: bool) -> "fitz.Document":
+        if stream:
+            with open(path, "rb") as f:
+                return fitz.open(stream=f.read(), filetype="pdf")
+        return fitz.open(path)
+
+    @staticmethod
+    def _retire(entry: _Entry):
+        """Close now if idle, otherwise when the last user releases it."""
+        entry.evicted = True
+        if entry.users == 0:
+            entry.doc.close()
+
+    @contextmanager
+    def opened(self, path: str, keep: bool = True) -> Iterator["fitz.Document"]:
+        """Borrow the cached document for path (do not close it)."""
+        entry = self._acquire(path, keep)
+        try:
+            with entry.lock:
+                yield entry.doc
+        finally:
+            self._release(entry)
+
+    def evict(self, path: str):
+        """Drop every cached version of path (e.g. before deleting a temp file)."""
+        target = os.path.abspath(path)
+        with self._lock:
+            for key in [k for k in self._entries if k[0] == target]:
+                self._retire(self._entries.pop(key))
+
+# Singleton
+pdf_cache = PDFDocumentCache()
+
+
+def opened_pdf(path: str, keep: bool = True):
+    """Context manager yielding a shared open fitz.Document for path."""
+    return pdf_cache.opened(path, keep)
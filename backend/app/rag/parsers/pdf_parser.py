@@ -14,6 +14,8 @@ import pdfplumber
 from typing import Dict, List, Optional, Tuple
 import logging
 
+from .pdf_cache import opened_pdf
+
 logger = logging.getLogger(__name__)
 
 
@@ -24,9 +26,10 @@ class AdvancedPDFParser:
         self.logger = logger
     
     
-    def extract_text_pymupdf(self, pdf_path: str) -> Tuple[str, Dict]:
+    def extract_text_pymupdf(self, pdf_path: str, doc: Optional["fitz.Document"] = None) -> Tuple[str, Dict]:
         """
         Extract text using LlamaParse (if key exists) or PyMuPDF (fallback).
+        Pass an already-open doc to reuse it; it is then left open for the caller.
         """
         import os
         llama_key = os.getenv("LLAMA_CLOUD_API_KEY")
@@ -65,8 +68,10 @@ class AdvancedPDFParser:
                 # Fall through to PyMuPDF
         
         # 2. PyMuPDF Fallback (Existing Logic)
+        owns_doc = doc is None
         try:
-            doc = fitz.open(pdf_path)
+            if owns_doc:
+                doc = fitz.open(pdf_path)
             
             # Extract metadata
             metadata = {
@@ -97,7 +102,8 @@ class AdvancedPDFParser:
                     full_text.append(f"\n--- Page {page_num} ---\n")
                     full_text.append("\n\n".join(page_text))
             
-            doc.close()
+            if owns_doc:
+                doc.close()
             
             extracted_text = "\n".join(full_text)
             self.logger.info(f"Extracted {len(extracted_text)} characters from {metadata['total_pages']} pages")
@@ -143,6 +149,35 @@ class AdvancedPDFParser:
             self.logger.warning(f"Table extraction failed: {str(e)}")
             return []
     
+    def extract_tables_pymupdf(self, doc: "fitz.Document") -> List[Dict]:
+        """
+        Extract tables from an open PyMuPDF document (page.find_tables).
+        
+        Returns:
+            List of table dictionaries with page numbers (same shape as extract_tables)
+        """
+        tables_found = []
+        
+        try:
+            for page_num, page in enumerate(doc, start=1):
+                for table_idx, found in enumerate(page.find_tables().tables):
+                    table = found.extract()
+                    if table:
+                        tables_found.append({
+                            "page": page_num,
+                            "table_index": table_idx,
+                            "content": self._table_to_text(table),
+                            "rows": len(table),
+                            "cols": len(table[0]) if table else 0
+                        })
+            
+            self.logger.info(f"Extracted {len(tables_found)} tables")
+            return tables_found
+            
+        except Exception as e:
+            self.logger.warning(f"Table extraction failed: {str(e)}")
+            return []
+    
     def _table_to_text(self, table: List[List]) -> str:
         """Convert table data to readable text format."""
         if not table:
@@ -171,14 +206,16 @@ class AdvancedPDFParser:
         }
         
         try:
-            # 1. Extract main text with PyMuPDF
-            text, metadata = self.extract_text_pymupdf(pdf_path)
-            result["text"] = text
-            result["metadata"] = metadata
-            
-            # 2. Extract tables separately
-            tables = self.extract_tables(pdf_path)
-            result["tables"] = tables
+            # Open once: text and tables both come from the same (cached) PyMuPDF document
+            with opened_pdf(pdf_path) as doc:
+                # 1. Extract main text with PyMuPDF
+                text, metadata = self.extract_text_pymupdf(pdf_path, doc=doc)
+                result["text"] = text
+                result["metadata"] = metadata
+                
+                # 2. Extract tables separately
+                tables = self.extract_tables_pymupdf(doc)
+                result["tables"] = tables
             
             # 3. Integrate tables into text if found
             if tables:
@@ -1,14 +1,24 @@
 import re
 import math
-import statistics
 import logging
 from typing import List, Dict, Optional, Tuple, Any
 from dataclasses import dataclass, field
+import numpy as np
 import pdfplumber  # Requirement: pdfplumber
 from collections import Counter
 
+from .text_splitter import SplitMergeChunker
+
 logger = logging.getLogger(__name__)
 
+# Line-cleanup patterns, compiled once (these run per line of every page)
+_HEADER_NUM_RE = re.compile(r'^\d+(?:\.\d+)*\s+')
+_CITATION_RE = re.compile(r'\[\s*\d+(?:\s*,\s*\d+)*\s*\]')
+_NUMBER_ONLY_RE = re.compile(r'\d+$')
+
+# Shared, stateless: built once instead of per flushed buffer
+_SPLITTER = SplitMergeChunker(chunk_size=2000, chunk_overlap=200)
+
 @dataclass
 class SectionMetadata:
     title: str = "Uncategorized"
@@ -46,6 +56,13 @@ class AcademicPDFParser:
         r'^conclusion': 'Conclusion',
         r'^references': 'References'
     }
+    # One fused, case-insensitive regex; group g{i} is the i-th pattern, so
+    # m.lastgroup gives the canonical section name in the same pass
+    _SECTION_HEADER_RE = re.compile(
+        "|".join(f"(?P<g{i}>{pat})" for i, pat in enumerate(SECTION_HEADERS)),
+        re.IGNORECASE
+    )
+    _SECTION_HEADER_NAMES = list(SECTION_HEADERS.values())
     
     def __init__(self, file_path: str):
         self.file_path = file_path
@@ -56,6 +73,7 @@ class AcademicPDFParser:
         self.current_section = "Abstract"  # Default start
         self.body_font_size = 0.0
         self.header_font_size_threshold = 0.0
+        self._bold_font_cache: Dict[str, bool] = {}  # fontname -> is bold (papers use a handful)
 
     def parse(self) -> List[AcademicChunk]:
         """Main execution pipeline."""
@@ -64,21 +82,27 @@ class AcademicPDFParser:
         try:
             with pdfplumber.open(self.file_path) as pdf:
                 # Pass 1: Global Analysis (Font stats, layout type)
-                self._analyze_global_stats(pdf)
+                sampled_words = self._analyze_global_stats(pdf)
                 
                 # Pass 2: Page-by-Page Extraction
                 for i, page in enumerate(pdf.pages):
                     page_num = i + 1
                     logger.debug(f"Parsing Page {page_num}")
                     
+                    # One extract_words per page (reused from Pass 1 when sampled);
+                    # every later step works on views of it
+                    words = sampled_words.pop(i, None)
+                    if words is None:
+                        words = self._extract_words(page)
+                    
                     # A. Filter artifacts (Header/Footer)
-                    cropped_page = self._remove_artifacts(page)
+                    words, x0, top = self._remove_artifacts(page, words)
                     
                     # B. Detect Layout (1-col vs 2-col)
-                    layout_type = self._detect_layout(cropped_page)
+                    layout_type = self._detect_layout(page, x0)
                     
                     # C. Extract Text Blocks in Reading Order
-                    text_blocks = self._extract_blocks_flow_aware(cropped_page, layout_type)
+                    text_blocks = self._extract_blocks_flow_aware(page, layout_type, words, x0, top)
                     
                     # D. Process Blocks (Clean, Detect Sections, Chunk)
                     self._process_text_blocks(text_blocks, page_num)
@@ -89,95 +113,114 @@ class AcademicPDFParser:
             logger.error(f"PDF Analysis Failed: {e}", exc_info=True)
             return []
 
-    def _analyze_global_stats(self, pdf):
-        """Determine what counts as 'Body Text' vs 'Header'."""
+    @staticmethod
+    def _extract_words(page) -> List[Dict]:
+        return page.extract_words(keep_blank_chars=False, extra_attrs=["size", "fontname"])
+
+    def _analyze_global_stats(self, pdf) -> Dict[int, List[Dict]]:
+        """Determine what counts as 'Body Text' vs 'Header'. Returns the sampled pages' words."""
+        sampled = {}
         all_sizes = []
         # Sample first 5 pages
-        for p in pdf.pages[:5]:
-            words = p.extract_words(extra_attrs=["size"])
+        for i, p in enumerate(pdf.pages[:5]):
+            words = sampled[i] = self._extract_words(p)
             all_sizes.extend([w["size"] for w in words])
             
         if not all_sizes:
             self.body_font_size = 10.0 # Default
-            return
+            return sampled
 
         # Body text is usually the mode
-        self.body_font_size = statistics.mode([round(s, 1) for s in all_sizes])
+        self.body_font_size = Counter(round(s, 1) for s in all_sizes).most_common(1)[0][0]
         # Headers are usually > 1.1x body
         self.header_font_size_threshold = self.body_font_size * 1.1
         logger.info(f"Detected Body Font: {self.body_font_size}pt, Header Threshold: {self.header_font_size_threshold}pt")
+        return sampled
 
-    def _remove_artifacts(self, page):
-        """Crop headers/footers based on y-position heuristics."""
+    def _remove_artifacts(self, page, words: List[Dict]) -> Tuple[List[Dict], np.ndarray, np.ndarray]:
+        """
+        Drop header/footer words based on y-position heuristics.
+        Returns the kept words plus their x0/top as arrays (SoA view).
+        """
         h = page.height
-        w = page.width
         # Standard academic margins: 5-8% top/bottom
         top_margin = h * 0.05
         bottom_margin = h * 0.93
         
-        return page.crop((0, top_margin, w, bottom_margin))
+        n = len(words)
+        x0 = np.fromiter((wd['x0'] for wd in words), float, n)
+        top = np.fromiter((wd['top'] for wd in words), float, n)
+        bottom = np.fromiter((wd['bottom'] for wd in words), float, n)
+        
+        # Same rule as cropping to the body band: keep words overlapping it
+        keep = np.flatnonzero((bottom > top_margin) & (top < bottom_margin))
+        if len(keep) == n:
+            return words, x0, top
+        return [words[i] for i in keep.tolist()], x0[keep], top[keep]
 
-    def _detect_layout(self, page) -> str:
+    def _detect_layout(self, page, x0: np.ndarray) -> str:
         """Heuristic: Check if text density is split in middle."""
-        w = page.width
-        mid_x = w / 2
+        if not len(x0):
+            return "two_column"
         
-        # Check for gap in the middle 20%
-        center_zone = page.crop((mid_x - 30, 0, mid_x + 30, page.height))
-        words_in_center = center_zone.extract_words()
+        # x-histogram of word starts (20 bins); the two center bins cover
+        # the middle ~10% of the width (about +/-30pt)
+        hist, _ = np.histogram(x0, bins=20, range=(0, page.width))
         
-        # If very few words in center strip, it's 2-column
-        if len(words_in_center) < 5:
+        # If almost no text in the center strip, it's 2-column
+        if hist[9:11].sum() < 0.05 * hist.sum():
             return "two_column"
         return "single_column"
 
-    def _extract_blocks_flow_aware(self, page, layout: str):
-        """Get text blocks respecting reading order."""
-        words = page.extract_words(keep_blank_chars=False, extra_attrs=["size", "fontname"])
-        w = page.width
-        mid_x = w / 2
+    def _extract_blocks_flow_aware(self, page, layout: str, words: List[Dict],
+                                   x0: np.ndarray, top: np.ndarray):
+        """Get text blocks respecting reading order (masks and sorts run on the SoA arrays)."""
+        if not words:
+            return []
+        mid_x = page.width / 2
 
         if layout == "two_column":
             # Split words into Left and Right buckets
-            left_col = [wd for wd in words if wd['x0'] < mid_x]
-            right_col = [wd for wd in words if wd['x0'] >= mid_x]
+            left_idx = np.flatnonzero(x0 < mid_x)
+            right_idx = np.flatnonzero(x0 >= mid_x)
             
-            # Sort individual columns Top-Down
-            left_col.sort(key=lambda x: (x['top'], x['x0']))
-            right_col.sort(key=lambda x: (x['top'], x['x0']))
+            # Sort individual columns Top-Down (lexsort: last key is primary)
+            left_idx = left_idx[np.lexsort((x0[left_idx], top[left_idx]))]
+            right_idx = right_idx[np.lexsort((x0[right_idx], top[right_idx]))]
             
-            return self._group_words_into_lines(left_col) + self._group_words_into_lines(right_col)
+            return (self._group_words_into_lines(words, top, left_idx)
+                    + self._group_words_into_lines(words, top, right_idx))
         else:
-            words.sort(key=lambda x: (x['top'], x['x0']))
-            return self._group_words_into_lines(words)
+            return self._group_words_into_lines(words, top, np.lexsort((x0, top)))
 
-    def _group_words_into_lines(self, words) -> List[Dict]:
-        """Group words into semantic lines/blocks."""
-        if not words:
+    def _group_words_into_lines(self, words, top: np.ndarray, order: np.ndarray) -> List[Dict]:
+        """Group words (visited in `order`) into semantic lines/blocks."""
+        if not len(order):
             return []
             
-        lines = []
-        current_line = [words[0]]
-        
-        for word in words[1:]:
-            last_word = current_line[-1]
-            # Same line heuristic: overlaps vertically or very close y-distance
-            vertical_diff = abs(word['top'] - last_word['top'])
-            
-            if vertical_diff < 5: # 5px tolerance
-                current_line.append(word)
-            else:
-                lines.append(self._finalize_line(current_line))
-                current_line = [word]
+        # Same line heuristic: overlaps vertically or very close y-distance
+        # to the previous word. Line breaks are found in one vectorized pass
+        # (5px tolerance), then words are sliced per line.
+        breaks = (np.flatnonzero(np.abs(np.diff(top[order])) >= 5) + 1).tolist()
+        order = order.tolist()
         
-        lines.append(self._finalize_line(current_line))
-        return lines
+        return [
+            self._finalize_line([words[i] for i in order[s:e]])
+            for s, e in zip([0, *breaks], [*breaks, len(order)])
+        ]
+
+    def _is_bold(self, fontname: str) -> bool:
+        """Memoized 'bold' in fontname check."""
+        bold = self._bold_font_cache.get(fontname)
+        if bold is None:
+            bold = self._bold_font_cache[fontname] = "bold" in fontname.lower()
+        return bold
 
     def _finalize_line(self, word_list):
         """Convert list of words to line dict with stats."""
         text = " ".join([w['text'] for w in word_list])
-        avg_size = statistics.mean([w['size'] for w in word_list])
-        is_bold = any("bold" in w.get('fontname', '').lower() for w in word_list)
+        avg_size = sum(w['size'] for w in word_list) / len(word_list)
+        is_bold = any(self._is_bold(w.get('fontname', '')) for w in word_list)
         return {
             "text": text,
             "size": avg_size,
@@ -194,16 +237,15 @@ class AcademicPDFParser:
             if not text:
                 continue
                 
-            # 1. Check if Header
-            is_header = self._is_section_header(line)
-            if is_header:
+            # 1. Check if Header (detection and title normalization in one step)
+            header_title = self._match_section_header(line, text)
+            if header_title:
                 # Flush previous buffer
                 self._flush_buffer(buffer, page_num)
                 buffer = []
                 
                 # Update Context
-                clean_title = self._clean_header_text(text)
-                self.current_section = clean_title
+                self.current_section = header_title
                 continue
             
             # 2. Check for Citation/Equation noise
@@ -214,26 +256,26 @@ class AcademicPDFParser:
         # Flush remaining
         self._flush_buffer(buffer, page_num)
 
-    def _is_section_header(self, line) -> bool:
-        """Detect headers via size or regex."""
-        text = line['text']
+    def _match_section_header(self, line, text: str) -> Optional[str]:
+        """Detect headers via regex or size; return the section title or None."""
+        raw = line['text']
         
-        # Rule 1: Font Size
-        if line['size'] >= self.header_font_size_threshold:
-            return True
+        # Rule 1: Known section name, even if small font (must be short);
+        # the matching group maps straight to the canonical name
+        if len(raw) < 100:
+            m = self._SECTION_HEADER_RE.match(raw)
+            if m:
+                return self._SECTION_HEADER_NAMES[int(m.lastgroup[1:])]
         
-        # Rule 2: Regex matching "1. Introduction" even if small font
-        # Must be short
-        if len(text) < 100:
-            for pattern in self.SECTION_HEADERS:
-                if re.search(pattern, text.lower()):
-                    return True
-        return False
+        # Rule 2: Font Size
+        if line['size'] >= self.header_font_size_threshold:
+            return self._clean_header_text(text)
+        return None
 
     def _clean_header_text(self, text: str) -> str:
         """Normalize '1. Introduction' -> 'Introduction'."""
         # Remove leading numbers
-        text = re.sub(r'^\d+(\.\d+)*\s+', '', text)
+        text = _HEADER_NUM_RE.sub('', text)
         return text.title()
 
     def _clean_content(self, text: str) -> Optional[str]:
@@ -243,10 +285,10 @@ class AcademicPDFParser:
         # text = re.sub(r'\$.*?\$', '[EQUATION]', text) 
         
         # 2. Remove Citations [12] or [12, 13]
-        text = re.sub(r'\[\s*\d+(\s*,\s*\d+)*\s*\]', '', text)
+        text = _CITATION_RE.sub('', text)
         
         # 3. Skip standalone numbers (page nums missed by crop)
-        if re.match(r'^\d+$', text):
+        if _NUMBER_ONLY_RE.match(text):
             return None
             
         return text
@@ -267,14 +309,7 @@ class AcademicPDFParser:
             
         # Hard Limit: ~500 words / 3000 chars per chunk to ensure precision
         # We use a simple splitter to respect sentence boundaries
-        from langchain_text_splitters import RecursiveCharacterTextSplitter
-        splitter = RecursiveCharacterTextSplitter(
-            chunk_size=2000, 
-            chunk_overlap=200,
-            separators=["\n\n", ". ", " ", ""]
-        )
-        
-        sub_chunks = splitter.split_text(full_text)
+        sub_chunks = _SPLITTER.split_text(full_text)
         total_sub = len(sub_chunks)
         
         importance = self._derive_importance(self.current_section)
@@ -305,6 +340,6 @@ class AcademicPDFParser:
         return "background"
 
 # Facade
-def parse_academic_pdf(file_path: str) -> List[AcadmicChunk]:
+def parse_academic_pdf(file_path: str) -> List[AcademicChunk]:
     parser = AcademicPDFParser(file_path)
     return parser.parse()
@@ -0,0 +1,108 @@
+"""
+Split-then-Merge Text Chunker
+~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+Drop-in replacement for RecursiveCharacterTextSplitter in the PDF parsers.
+
+Pass 1: one regex scan records every separator boundary and its strength
+        (paragraph > line > sentence > word).
+Pass 2: a linear walk cuts each chunk at the strongest boundary in the back
+        half of the size window, then steps back `overlap` chars (aligned to
+        a boundary) for the next chunk.
+
+Chunks come back with their (start, end) character offsets in the source
+text, so callers can map chunks to pages without re-summing lengths.
+"""
+
+import re
+from bisect import bisect_left, bisect_right
+from typing import List, Tuple
+
+# Separator -> strength; alternation order makes "\n\n" win over "\n", ". " over " "
+_SEP_RE = re.compile(r'\n\n+|\n|\. | ')
+_STRENGTH = {"\n": 2, ". ": 1, " ": 0}
+
+
+class SplitMergeChunker:
+    """Size-bounded chunker that prefers paragraph, then line, sentence, word breaks."""
+
+    def __init__(self, chunk_size: int = 2000, chunk_overlap: int = 200):
+        self.chunk_size = chunk_size
+        self.chunk_overlap = min(chunk_overlap, chunk_size // 2)
+
+    def chunks(self, text: str) -> List[Tuple[str, int, int]]:
+        """Split text into (chunk_text, start_char, end_char), whitespace-trimmed."""
+        if len(text) <= self.chunk_size:
+            # Fits in one chunk: skip the separator scan entirely
+            s = len(text) - len(text.lstrip())
+            e = len(text.rstrip())
+            return [(text[s:e], s, e)] if s < e else []
+
+        # Pass 1: per separator, where a chunk cut there stops (before the
+        # separator, keeping a sentence's period), where the next chunk may
+        # start (just after it), and its strength
+        stops: List[int] = []
+        ends: List[int] = []
+        strengths: List[int] = []
+        for m in _SEP_RE.finditer(text):
+            sep = m.group()
+            stops.append(m.start() + 1 if sep == ". " else m.start())
+            ends.append(m.end())
+            strengths.append(3 if sep.startswith("\n\n") else _STRENGTH[sep])
+
+        # Pass 2: greedy merge up to chunk_size
+        out = []
+        n = len(text)
+        size = self.chunk_size
+        start = 0
+        fresh = 0  # First non-space char after the previous chunk
+        while start < n:
+            limit = start + size
+            if limit >= n:
+                cut = n
+            else:
+                # Only boundaries past fresh text, so a chunk never ends
+                # inside the previous one (i.e. repeats only the overlap)
+                lo = bisect_right(ends, max(start, fresh))
+                # Eligible if the chunk text fits; its trailing separator need not
+                hi = bisect_right(stops, limit)
+                if lo == hi:
+                    cut = limit  # No separator in range: hard split
+                else:
+                    # Strongest boundary in the back half; latest wins ties
+                    cut = ends[hi - 1]
+                    best = strengths[hi - 1]
+                    floor = start + size // 2
+                    for i in range(hi - 2, lo - 1, -1):
+                        if ends[i] < floor or best == 3:
+                            break
+                        if strengths[i] > best:
+                            cut, best = ends[i], strengths[i]
+
+            # Trim surrounding whitespace, keeping offsets exact
+            s, e = start, cut
+            while s < e and text[s].isspace():
+                s += 1
+            while e > s and text[e - 1].isspace():
+                e -= 1
+            if s < e:
+                out.append((text[s:e], s, e))
+
+            fresh = cut
+            while fresh < n and text[fresh].isspace():
+                fresh += 1
+            if fresh >= n:
+                break
+            # Next chunk re-reads the last `overlap` chars, starting on a boundary
+            # after this chunk's first char
+            nxt = cut
+            if self.chunk_overlap:
+                j = bisect_left(ends, max(cut - self.chunk_overlap, s + 1))
+                if j < len(ends) and ends[j] < cut:
+                    nxt = ends[j]
+            # A whitespace run longer than the window leaves nothing to overlap
+            start = nxt if fresh < nxt + size else fresh
+        return out
+
+    def split_text(self, text: str) -> List[str]:
+        """Chunk texts only (RecursiveCharacterTextSplitter-compatible)."""
+        return [c[0] for c in self.chunks(text)]
@@ -19,12 +19,22 @@ Layers:
 import re
 import logging
 from enum import Enum
-from typing import List, Dict, Tuple, Optional
+from functools import lru_cache
+from itertools import islice
+from typing import Deque, List, Dict, Tuple, Optional
+from collections import deque
 from dataclasses import dataclass, field
 from datetime import datetime
 
 logger = logging.getLogger(__name__)
 
+# Optional: google-re2 (linear-time DFA engine, no catastrophic backtracking)
+# for the pattern sets that scan document text and user queries
+try:
+    import re2 as _re2
+except ImportError:
+    _re2 = None
+
 
 # ============================================================================
 # LAYER 1: DOCUMENT TYPE DETECTION
@@ -43,71 +53,190 @@ class DocumentType(Enum):
 # Detection patterns per document type
 DOC_PATTERNS = {
     DocumentType.EXAM: [
-        r'\b(question|q\.?\s*\d+|answer|marks?|score|exam|test|quiz)\b',
-        r'\b(solve|calculate|find|determine|prove|show that|write a (function|program|code))\b',
-        r'\b(PYQ|previous year|mid.?term|end.?term|makeup|semester|internal)\b',
+        r'\b(?:question|q\.?\s*\d+|answer|marks?|score|exam|test|quiz)\b',
+        r'\b(?:solve|calculate|find|determine|prove|show that|write a (?:function|program|code))\b',
+        r'\b(?:PYQ|previous year|mid.?term|end.?term|makeup|semester|internal)\b',
         r'\[\s*\d+\s*marks?\s*\]',
         r'\(\s*\d+\s*marks?\s*\)',
-        r'\b(CSE|ECE|EEE|MECH|IT|B\.?Tech)\s*\d{4}\b',
+        r'\b(?:CSE|ECE|EEE|MECH|IT|B\.?Tech)\s*\d{4}\b',
     ],
     DocumentType.RESEARCH: [
-        r'\b(abstract|introduction|methodology|conclusion|references|doi)\b',
-        r'\b(we propose|this paper|our approach|state.?of.?the.?art|related work)\b',
-        r'\b(BLEU|F1.?score|accuracy|precision|recall|baseline|benchmark)\b',
-        r'\b(et al\.?|arXiv|IEEE|ACM|Springer|CVPR|NeurIPS|ICML)\b',
+        r'\b(?:abstract|introduction|methodology|conclusion|references|doi)\b',
+        r'\b(?:we propose|this paper|our approach|state.?of.?the.?art|related work)\b',
+        r'\b(?:BLEU|F1.?score|accuracy|precision|recall|baseline|benchmark)\b',
+        r'\b(?:et al\.?|arXiv|IEEE|ACM|Springer|CVPR|NeurIPS|ICML)\b',
     ],
     DocumentType.LEGAL: [
-        r'\b(hereby|whereas|notwithstanding|pursuant|hereinafter)\b',
-        r'\b(clause|section|article|subsection|agreement|contract|law)\b',
-        r'\b(court|plaintiff|defendant|jurisdiction|tribunal)\b',
-        r'\b(shall|must not|liability|indemnify|warranty)\b',
+        r'\b(?:hereby|whereas|notwithstanding|pursuant|hereinafter)\b',
+        r'\b(?:clause|section|article|subsection|agreement|contract|law)\b',
+        r'\b(?:court|plaintiff|defendant|jurisdiction|tribunal)\b',
+        r'\b(?:shall|must not|liability|indemnify|warranty)\b',
     ],
     DocumentType.MEDICAL: [
-        r'\b(patient|diagnosis|treatment|symptoms|prescription|dosage)\b',
-        r'\b(mg|ml|tablet|injection|oral|intravenous)\b',
-        r'\b(clinical|pathology|radiology|MRI|CT scan|X-ray)\b',
-        r'\b(doctor|physician|nurse|hospital|ICU)\b',
+        r'\b(?:patient|diagnosis|treatment|symptoms|prescription|dosage)\b',
+        r'\b(?:mg|ml|tablet|injection|oral|intravenous)\b',
+        r'\b(?:clinical|pathology|radiology|MRI|CT scan|X-ray)\b',
+        r'\b(?:doctor|physician|nurse|hospital|ICU)\b',
     ],
     DocumentType.TECH_DOC: [
-        r'\b(API|endpoint|request|response|JSON|REST|GraphQL)\b',
-        r'\b(install|configure|setup|deployment|docker|kubernetes)\b',
-        r'\b(function|method|class|parameter|return|async|await)\b',
+        r'\b(?:API|endpoint|request|response|JSON|REST|GraphQL)\b',
+        r'\b(?:install|configure|setup|deployment|docker|kubernetes)\b',
+        r'\b(?:function|method|class|parameter|return|async|await)\b',
         r'```[\w]*\n',  # Code blocks
     ],
     DocumentType.LECTURE: [
-        r'\b(lecture|slide|chapter|topic|learning objectives)\b',
-        r'\b(example|definition|theorem|lemma|proof|corollary)\b',
-        r'\b(summary|recap|key points|takeaway)\b',
+        r'\b(?:lecture|slide|chapter|topic|learning objectives)\b',
+        r'\b(?:example|definition|theorem|lemma|proof|corollary)\b',
+        r'\b(?:summary|recap|key points|takeaway)\b',
     ],
 }
 
+def _lower_literals(pattern: str) -> str:
+    """Lowercase a pattern's literal letters, leaving escapes (\\S, \\W, ...) untouched."""
+    return re.sub(r'\\.|[A-Z]+', lambda m: m.group() if m.group()[0] == '\\' else m.group().lower(), pattern)
+
+
+# "\b(word|word two|...)\b" with plain-literal alternatives only
+_LITERAL_GROUP_RE = re.compile(r'^\\b\(\?:([^()?*+.\[\]{}|^$\\]+(?:\|[^()?*+.\[\]{}|^$\\]+)*)\)\\b$')
+
+
+def _trie_regex(words: List[str]) -> str:
+    """Prefix-factored alternation, e.g. [proof, prove] -> pro(?:of|ve)."""
+    trie: Dict = {}
+    for w in words:
+        node = trie
+        for ch in w:
+            node = node.setdefault(ch, {})
+        node[""] = {}
+
+    def emit(node: Dict) -> str:
+        optional = "" in node
+        alts = [ch + emit(child) for ch, child in sorted(node.items()) if ch]
+        if not alts:
+            return ""
+        body = alts[0] if len(alts) == 1 else f"(?:{'|'.join(alts)})"
+        if optional:
+            return f"(?:{body})?" if len(alts) == 1 and len(body) > 1 else f"{body}?"
+        return body
+
+    return emit(trie)
+
+
+def _factor_literals(pattern: str) -> str:
+    """
+    Rewrite a \\b-bounded group of plain words as a trie so the backtracking
+    engine walks shared prefixes once instead of retrying every word.
+    With \\b on both sides at most one word can match at a position, so
+    the rewrite matches exactly the same spans. Other patterns pass through.
+    """
+    m = _LITERAL_GROUP_RE.match(pattern)
+    if not m:
+        return pattern
+    return rf"\b{_trie_regex(m.group(1).split('|'))}\b"
+
+
+def _fuse(patterns: List[str], flags: str = ""):
+    """
+    One compiled alternation for a pattern list: one scan instead of one per pattern.
+    flags are inline letters ("im") so the same source works for re and re2.
+    """
+    source = "|".join(f"(?:{_factor_literals(p)})" for p in patterns)
+    if flags:
+        source = f"(?{flags}){source}"
+    return _compile(source)
+
+
+def _compile(source: str):
+    """Compile with re2 when available, else re."""
+    if _re2 is not None:
+        try:
+            return _re2.compile(source)
+        except Exception as e:
+            logger.warning(f"re2 rejected pattern, using re: {e}")
+    return re.compile(source)
+
+
+# run_pipeline classifies from the first few chunks only; the patterns are
+# dense enough that a few KB decide the type
+DOC_TYPE_SAMPLE_CHUNKS = 3
+DOC_TYPE_SAMPLE_CHARS = 4096
+
+# Compiled once at import; detection runs on every request. The text is
+# lowercased before matching, so patterns are lowercased here instead of
+# paying for case-folding (IGNORECASE) on every character at match time.
+_DOC_PATTERNS_LOWER = {
+    doc_type: [_lower_literals(p) for p in patterns]
+    for doc_type, patterns in DOC_PATTERNS.items()
+}
+# A type's score is the sum of each pattern's own match count, so patterns
+# are still compiled one by one: a single finditer over the fused
+# alternation would consume overlapping spans once ("[5 marks]" is a hit
+# for both `marks?` and `\[\s*\d+\s*marks?\s*\]`). The fused pattern only
+# gates the type: no match means a score of 0 without the per-pattern scans.
+DOC_PATTERNS_FUSED = {
+    doc_type: _fuse(patterns, "m")
+    for doc_type, patterns in _DOC_PATTERNS_LOWER.items()
+}
+DOC_PATTERNS_COMPILED = {
+    doc_type: [_compile(f"(?m){p}") for p in patterns]
+    for doc_type, patterns in _DOC_PATTERNS_LOWER.items()
+}
+# Index-aligned views for scoring; DOC_PATTERNS lists EXAM first
+_DOC_TYPES = tuple(DOC_PATTERNS_FUSED)
+_DOC_SCORERS = tuple(
+    (DOC_PATTERNS_FUSED[doc_type], DOC_PATTERNS_COMPILED[doc_type])
+    for doc_type in _DOC_TYPES
+)
+
 
 def detect_document_type(filename: str, content: str) -> DocumentType:
     """
     Detect document type from filename and content.
     Returns the most likely document type.
+    Only the first DOC_TYPE_SAMPLE_CHARS of content are scanned.
     """
-    text = f"{filename.lower()} {content.lower()}"
-    
-    scores = {}
-    for doc_type, patterns in DOC_PATTERNS.items():
-        score = sum(
-            len(re.findall(p, text, re.IGNORECASE | re.MULTILINE))
-            for p in patterns
-        )
-        scores[doc_type] = score
+    return _detect_document_type(filename, content[:DOC_TYPE_SAMPLE_CHARS])
+
+
+# Same file + retrieved context recurs across follow-ups and re-renders
+@lru_cache(maxsize=1024)
+def _detect_document_type(filename: str, content: str) -> DocumentType:
+    # One lowercase copy of the (already capped) sample, not of each part.
+    # Joined with a space as before: `.` in mid.?term etc. must still match
+    # across the filename/content seam.
+    text = (filename + " " + content).lower()
     
-    # Prioritize EXAM detection (most common use case)
-    if scores.get(DocumentType.EXAM, 0) >= 3:
+    # Prioritize EXAM detection (most common use case): scored first, and
+    # the scan stops as soon as the threshold is reached
+    exam_hits = _score_doc_type(_DOC_SCORERS[0], text, stop_at=3)
+    if exam_hits >= 3:
         return DocumentType.EXAM
     
-    max_type = max(scores, key=scores.get)
-    if scores[max_type] >= 2:
-        return max_type
+    # Flat score list in _DOC_TYPES order (EXAM first, so ties still favor it)
+    scores = [exam_hits]
+    scores.extend(_score_doc_type(scorer, text) for scorer in _DOC_SCORERS[1:])
+    
+    best = max(scores)
+    if best >= 2:
+        return _DOC_TYPES[scores.index(best)]
     
     return DocumentType.GENERAL
 
 
+def _score_doc_type(scorer, text: str, stop_at: Optional[int] = None) -> int:
+    """Sum of per-pattern match counts (stops early once stop_at is reached)."""
+    gate, patterns = scorer
+    if not gate.search(text):
+        return 0
+    hits = 0
+    for pattern in patterns:
+        for _ in pattern.finditer(text):
+            hits += 1
+            if stop_at is not None and hits >= stop_at:
+                return hits
+    return hits
+
+
 # ============================================================================
 # LAYER 2: USER INTENT ROUTING
 # ============================================================================
@@ -127,61 +256,128 @@ class UserIntent(Enum):
 
 INTENT_PATTERNS = {
     UserIntent.WHAT_IS_THIS: [
-        r'^what (is|are) (this|these)',
-        r'^tell me about (this|the) (document|file|pdf)',
+        r'^what (?:is|are) (?:this|these)',
+        r'^tell me about (?:this|the) (?:document|file|pdf)',
     ],
     UserIntent.SUMMARIZE: [
-        r'\b(summarize|summary|summarise|overview|brief|tl;?dr)\b',
-        r'^(give|provide) (a|me) (summary|overview)',
-        r'what does (this|the) (document|file|paper) (say|contain|cover)',
+        r'\b(?:summarize|summary|summarise|overview|brief|tl;?dr)\b',
+        r'^(?:give|provide) (?:a|me) (?:summary|overview)',
+        r'what does (?:this|the) (?:document|file|paper) (?:say|contain|cover)',
     ],
     UserIntent.ANSWER_QUESTION: [
-        r'^(solve|answer|find|calculate|compute|determine)\b',
-        r'^(what|which|where|when|who|how many|how much)\b',
+        r'^(?:solve|answer|find|calculate|compute|determine)\b',
+        r'^(?:what|which|where|when|who|how many|how much)\b',
         r'\?$',
-        r'^(q\d+|question\s*\d+)',
+        r'^(?:q\d+|question\s*\d+)',
     ],
     UserIntent.EXPLAIN_CONCEPT: [
-        r'^(explain|describe|clarify|elaborate)',
-        r'^(how does|how do|why does|why do)',
-        r'^(what is|what are) (the|a) ',
-        r'(help me understand|break down)',
+        r'^(?:explain|describe|clarify|elaborate)',
+        r'^(?:how does|how do|why does|why do)',
+        r'^(?:what is|what are) (?:the|a) ',
+        r'(?:help me understand|break down)',
     ],
     UserIntent.WRITE_CODE: [
-        r'\b(write|generate|create|implement) (a |the )?(code|function|program|script)\b',
-        r'\b(coding|programming|algorithm)\b',
-        r'\b(python|java|c\+\+|javascript|code)\b',
+        r'\b(?:write|generate|create|implement) (?:a |the )?(?:code|function|program|script)\b',
+        r'\b(?:coding|programming|algorithm)\b',
+        r'\b(?:python|java|c\+\+|javascript|code)\b',
     ],
     UserIntent.DERIVE_FORMULA: [
-        r'\b(derive|derivation|formula|equation|proof|prove)\b',
-        r'\b(show that|demonstrate that)\b',
+        r'\b(?:derive|derivation|formula|equation|proof|prove)\b',
+        r'\b(?:show that|demonstrate that)\b',
     ],
     UserIntent.COMPARE: [
-        r'\b(compare|comparison|difference|versus|vs\.?|distinguish)\b',
-        r'\b(better|worse|advantage|disadvantage)\b',
+        r'\b(?:compare|comparison|difference|versus|vs\.?|distinguish)\b',
+        r'\b(?:better|worse|advantage|disadvantage)\b',
     ],
     UserIntent.VALIDATE_SOLUTION: [
-        r'\b(check|validate|verify|correct|wrong|mistake|error)\b',
-        r'\b(is this (right|correct|wrong))\b',
+        r'\b(?:check|validate|verify|correct|wrong|mistake|error)\b',
+        r'\b(?:is this (?:right|correct|wrong))\b',
     ],
     UserIntent.LIST_ITEMS: [
-        r'\b(list|enumerate|give me all|what are the)\b',
-        r'\b(steps|points|items|features|types|kinds)\b',
+        r'\b(?:list|enumerate|give me all|what are the)\b',
+        r'\b(?:steps|points|items|features|types|kinds)\b',
     ],
 }
 
+INTENT_PATTERNS_FUSED = {
+    intent: _fuse(patterns)
+    for intent, patterns in INTENT_PATTERNS.items()
+}
+
+# WHAT_IS_THIS (highest priority) is purely ^-anchored literals: the same
+# strings as a str.startswith tuple, so the regex loop can skip it
+_WHAT_IS_THIS_PREFIXES = tuple(
+    [f"what {verb} {obj}" for verb in ("is", "are") for obj in ("this", "these")]
+    + [f"tell me about {det} {noun}" for det in ("this", "the") for noun in ("document", "file", "pdf")]
+)
+# Only the head of a query decides its intent (most patterns are ^-anchored);
+# capping it bounds match time on pathological input when re2 is missing
+MAX_INTENT_QUERY_CHARS = 1024
+_INTENT_REGEX_ORDER = [
+    (intent, fused) for intent, fused in INTENT_PATTERNS_FUSED.items()
+    if intent is not UserIntent.WHAT_IS_THIS
+]
+
+
+# Section-targeting keyword buckets (RAGEngine's targeted search), in
+# priority order (first hit wins). Each bucket is one compiled substring
+# alternation: a single C-level scan of the query instead of one `w in q`
+# per keyword.
+INTENT_KEYWORDS = [
+    # 1. Formula / Math / Implementation
+    ("FORMULA", ["formula", "equation", "math", "algorithm", "notation", "implementation", "code"]),
+    # 2. Main Idea / Overview / Goal
+    ("OVERVIEW", ["main idea", "core idea", "summary", "abstract", "contribution", "goal", "purpose", "problem"]),
+    # 3. Metrics / Results / SOTA
+    ("METRICS", ["result", "performance", "score", "accuracy", "f1", "table", "graph", "benchmark", "sota"]),
+    # 4. Limitations / Critique
+    ("LIMITATIONS", ["limitation", "drawback", "failure", "weakness", "critique", "gap"]),
+    # 5. Methodology / Specifics
+    ("METHODOLOGY", ["how", "method", "approach", "architecture", "setup", "training"]),
+]
+_INTENT_KEYWORD_RES = [
+    (label, re.compile("|".join(map(re.escape, words))))
+    for label, words in INTENT_KEYWORDS
+]
+
 
 def detect_intent(query: str) -> UserIntent:
     """Detect user intent from query."""
-    query_lower = query.lower().strip()
+    return route_query(query)[0]
+
+
+# Pure function of the query; the engine and the pipeline both route the
+# same query per request, so the second caller is a cache hit
+@lru_cache(maxsize=8192)
+def route_query(query: str) -> Tuple[UserIntent, str]:
+    """
+    Route a query once for every consumer.
+    Returns (answer-style intent, section-targeting label).
+    """
+    q = query.lower()
+    return _match_intent(q[:MAX_INTENT_QUERY_CHARS].strip()), _match_section_label(q)
+
+
+def _match_intent(query_lower: str) -> UserIntent:
+    if query_lower.startswith(_WHAT_IS_THIS_PREFIXES):
+        return UserIntent.WHAT_IS_THIS
     
-    for intent, patterns in INTENT_PATTERNS.items():
-        if any(re.search(p, query_lower) for p in patterns):
+    # Remaining intents in priority order; each is one search of its fused patterns
+    for intent, fused in _INTENT_REGEX_ORDER:
+        if fused.search(query_lower):
             return intent
     
     return UserIntent.GENERAL
 
 
+def _match_section_label(query_lower: str) -> str:
+    for label, pattern in _INTENT_KEYWORD_RES:
+        if pattern.search(query_lower):
+            return label
+    
+    return "GENERAL"
+
+
 # ============================================================================
 # LAYER 3: DOMAIN RULE ENFORCEMENT
 # ============================================================================
@@ -193,6 +389,11 @@ class DomainRule:
     check: str  # Regex pattern to check
     violation_message: str
     fix_instruction: str
+    pattern: "re.Pattern" = field(init=False, repr=False, compare=False)
+    
+    def __post_init__(self):
+        # Matched against lowercased answers: lowercase once, no IGNORECASE
+        self.pattern = re.compile(_lower_literals(self.check))
 
 
 # Domain-specific rules
@@ -200,13 +401,13 @@ DOMAIN_RULES = {
     "data_structures": [
         DomainRule(
             name="queue_fifo",
-            check=r"queue.*(lifo|last.?in.?first.?out)",
+            check=r"queue.*(?:lifo|last.?in.?first.?out)",
             violation_message="Queue must be FIFO, not LIFO",
             fix_instruction="Queue follows FIFO (First In First Out) principle"
         ),
         DomainRule(
             name="stack_lifo",
-            check=r"stack.*(fifo|first.?in.?first.?out)",
+            check=r"stack.*(?:fifo|first.?in.?first.?out)",
             violation_message="Stack must be LIFO, not FIFO",
             fix_instruction="Stack follows LIFO (Last In First Out) principle"
         ),
@@ -214,7 +415,7 @@ DOMAIN_RULES = {
     "research": [
         DomainRule(
             name="cite_formulas",
-            check=r"(formula|equation).*(not (stated|mentioned|provided|found))",
+            check=r"(?:formula|equation).*(?:not (?:stated|mentioned|provided|found))",
             violation_message="Core formulas should be extracted if present",
             fix_instruction="Extract and cite the formula from the paper"
         ),
@@ -222,7 +423,7 @@ DOMAIN_RULES = {
     "medical": [
         DomainRule(
             name="no_dosage_guess",
-            check=r"(might be|could be|probably|approximately)\s*\d+\s*(mg|ml|tablet)",
+            check=r"(?:might be|could be|probably|approximately)\s*\d+\s*(?:mg|ml|tablet)",
             violation_message="Never guess medical dosages",
             fix_instruction="Only provide exact dosages from the source document"
         ),
@@ -230,7 +431,7 @@ DOMAIN_RULES = {
     "legal": [
         DomainRule(
             name="exact_quotes",
-            check=r"(paraphrasing|in other words|essentially means)",
+            check=r"(?:paraphrasing|in other words|essentially means)",
             violation_message="Legal clauses should be quoted exactly",
             fix_instruction="Quote the exact legal text, do not paraphrase"
         ),
@@ -238,6 +439,13 @@ DOMAIN_RULES = {
 }
 
 
+# One fused pattern per domain: a single scan clears the (common) clean answer
+DOMAIN_RULES_FUSED = {
+    domain: _fuse([_lower_literals(r.check) for r in rules])
+    for domain, rules in DOMAIN_RULES.items()
+}
+
+
 def check_domain_rules(answer: str, doc_type: DocumentType) -> List[DomainRule]:
     """
     Check if answer violates any domain rules.
@@ -260,8 +468,13 @@ def check_domain_rules(answer: str, doc_type: DocumentType) -> List[DomainRule]:
     rules = DOMAIN_RULES.get(domain, [])
     answer_lower = answer.lower()
     
+    # One pass decides "no violations"; only a hit pays for the per-rule checks
+    # (a fused finditer alone could hide one rule's match inside another's)
+    if not DOMAIN_RULES_FUSED[domain].search(answer_lower):
+        return violations
+    
     for rule in rules:
-        if re.search(rule.check, answer_lower, re.IGNORECASE):
+        if rule.pattern.search(answer_lower):
             violations.append(rule)
     
     return violations
@@ -358,6 +571,16 @@ class ValidationResult:
     should_regenerate: bool = False
 
 
+# Defensive phrasing (each matching pattern costs confidence) and vague openers
+DEFENSIVE_PATTERNS = [
+    re.compile(r"(?:not mentioned|not stated|not provided|not found) in (?:the |this )?(?:context|document)"),
+    re.compile(r"(?:cannot|can't|unable to) (?:find|locate|determine)"),
+    re.compile(r"(?:no information|no data) (?:about|on|regarding)"),
+]
+DEFENSIVE_RE = re.compile("|".join(p.pattern for p in DEFENSIVE_PATTERNS))
+VAGUE_RE = re.compile(r"^(?:it depends|this varies|generally speaking)")
+
+
 def validate_answer(
     answer: str,
     query: str,
@@ -381,21 +604,16 @@ def validate_answer(
             confidence -= 0.3
     
     # Check 2: Defensive language when context exists
-    defensive_patterns = [
-        r"(not mentioned|not stated|not provided|not found) in (the |this )?(context|document)",
-        r"(cannot|can't|unable to) (find|locate|determine)",
-        r"(no information|no data) (about|on|regarding)",
-    ]
-    
-    for pattern in defensive_patterns:
-        if re.search(pattern, answer_lower) and len(context_text) > 100:
-            issues.append("Defensive response despite having context")
-            confidence -= 0.2
+    # Cheap length test first; one fused search gates the per-pattern penalties
+    if len(context_text) > 100 and DEFENSIVE_RE.search(answer_lower):
+        for pattern in DEFENSIVE_PATTERNS:
+            if pattern.search(answer_lower):
+                issues.append("Defensive response despite having context")
+                confidence -= 0.2
     
     # Check 3: For exam answers - should be direct
     if doc_type == DocumentType.EXAM and intent == UserIntent.ANSWER_QUESTION:
-        vague_patterns = [r"^(it depends|this varies|generally speaking)"]
-        if any(re.search(p, answer_lower) for p in vague_patterns):
+        if VAGUE_RE.search(answer_lower):
             issues.append("Vague answer for exam question")
             confidence -= 0.2
     
@@ -499,8 +717,10 @@ class FailureLog:
     suggested_fix: str
 
 
-# In-memory failure log (in production, use database)
-_failure_logs: List[FailureLog] = []
+# In-memory failure log (in production, use database); bounded ring buffer,
+# oldest entries drop off so memory stays flat under sustained failures
+MAX_FAILURE_LOGS = 10000
+_failure_logs: Deque[FailureLog] = deque(maxlen=MAX_FAILURE_LOGS)
 
 
 def log_failure(
@@ -557,6 +777,14 @@ class PipelineResult:
     issues: List[str] = field(default_factory=list)
 
 
+BASE_RULES = """RULES:
+1. Answer based ONLY on the provided context
+2. Be direct - start with the answer
+3. Cite page numbers when available
+4. Match the document's style and expectations
+"""
+
+
 def run_pipeline(
     query: str,
     filename: str,
@@ -567,15 +795,16 @@ def run_pipeline(
     
     Returns PipelineResult with all analysis and the appropriate system prompt.
     """
-    # Combine chunk content for analysis
-    context_text = "\n".join(c.get("content", "") for c in chunks)
+    # Type detection only needs a sample: the top chunks (capped in size by
+    # detect_document_type) instead of joining every retrieved chunk
+    sample = "\n".join(c.get("content", "") for c in islice(chunks, DOC_TYPE_SAMPLE_CHUNKS))
     
     # Layer 1: Document Type Detection
-    doc_type = detect_document_type(filename, context_text)
+    doc_type = detect_document_type(filename, sample)
     logger.info(f"[Layer 1] Document Type: {doc_type.value}")
     
     # Layer 2: Intent Routing
-    intent = detect_intent(query)
+    intent, _ = route_query(query)
     logger.info(f"[Layer 2] Intent: {intent.value}")
     
     # Layer 3-4: Get style guide (domain rules checked post-generation)
@@ -585,18 +814,14 @@ def run_pipeline(
     ctx_quality = assess_context_quality(query, chunks)
     logger.info(f"[Layer 4] Context Quality: sufficient={ctx_quality.is_sufficient}, relevance={ctx_quality.relevance_score:.2f}")
     
-    # Build system prompt
-    base_prompt = f"""You are a helpful assistant answering questions about {doc_type.value} documents.
+    # Build system prompt: static rules first, then per-document-type parts.
+    # Per-query parts (intent, question) go in the user message so the
+    # provider's prefix cache can reuse this whole block.
+    base_prompt = f"""{BASE_RULES}
+You are a helpful assistant answering questions about {doc_type.value} documents.
 Document Type Detected: {doc_type.value.upper()}
-User Intent: {intent.value}
 
 {style_guide}
-
-RULES:
-1. Answer based ONLY on the provided context
-2. Be direct - start with the answer
-3. Cite page numbers when available
-4. Match the document's style and expectations
 """
     
     # Determine if we should proceed
@@ -3,6 +3,7 @@ import logging
 from langchain_groq import ChatGroq
 from ..config import settings
 from .cache_manager import cache_manager
+from .production_pipeline import route_query
 
 logger = logging.getLogger(__name__)
 
@@ -27,11 +28,19 @@ class QueryOptimizer:
     """
     
     def __init__(self):
-        self.llm = ChatGroq(
-            model_name="llama-3.1-8b-instant",
-            api_key=settings.GROQ_API_KEY,
-            temperature=0.3
-        )
+        self._llm: Optional[ChatGroq] = None
+    
+    @property
+    def llm(self) -> ChatGroq:
+        # Created on first LLM call, not at import: intent classification
+        # alone never needs a Groq client
+        if self._llm is None:
+            self._llm = ChatGroq(
+                model_name="llama-3.1-8b-instant",
+                api_key=settings.GROQ_API_KEY,
+                temperature=0.3
+            )
+        return self._llm
         
     @cache_manager.cached_operation(prefix="hyde", ttl=86400)
     def generate_hyde_doc(self, query: str) -> str:
@@ -84,29 +93,7 @@ Current Query: {query}
         """
         Maps user query to specific academic section targets.
         """
-        q = query.lower()
-        
-        # 1. Formula / Math / Implementation
-        if any(w in q for w in ["formula", "equation", "math", "algorithm", "notation", "implementation", "code"]):
-            return "FORMULA"
-            
-        # 2. Main Idea / Overview / Goal
-        if any(w in q for w in ["main idea", "core idea", "summary", "abstract", "contribution", "goal", "purpose", "problem"]):
-            return "OVERVIEW"
-            
-        # 3. Metrics / Results / SOTA
-        if any(w in q for w in ["result", "performance", "score", "accuracy", "f1", "table", "graph", "benchmark", "sota"]):
-            return "METRICS"
-            
-        # 4. Limitations / Critique
-        if any(w in q for w in ["limitation", "drawback", "failure", "weakness", "critique", "gap"]):
-             return "LIMITATIONS"
-             
-        # 5. Methodology / Specifics
-        if any(w in q for w in ["how", "method", "approach", "architecture", "setup", "training"]):
-            return "METHODOLOGY"
-
-        return "GENERAL"
+        return route_query(query)[1]
 
 # Singleton
 query_optimizer = QueryOptimizer()
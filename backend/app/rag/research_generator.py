@@ -17,7 +17,8 @@ import re
 import logging
 from typing import List, Dict, Optional, Tuple
 from dataclasses import dataclass
-import requests
+from .llm import _chat_completion, _format_context, groq_error_message, source_id, source_id_header
+from .prompts import PROMPTS
 
 logger = logging.getLogger(__name__)
 
@@ -118,9 +119,8 @@ Question: {question}"""
     def __init__(self, api_key: str, model: str = "llama-3.1-8b-instant"):
         self.api_key = api_key
         self.model = model
-        self.api_url = "https://api.groq.com/openai/v1/chat/completions"
     
-    def generate(
+    async def generate(
         self,
         question: str,
         context_chunks: List[Dict],
@@ -152,7 +152,7 @@ Question: {question}"""
         )
         
         # 3. Generate answer via LLM
-        raw_answer = self._call_llm(user_prompt, max_tokens)
+        raw_answer = await self._call_llm(user_prompt, max_tokens)
         
         # 4. Extract formulas
         formulas = self._extract_formulas(raw_answer)
@@ -180,72 +180,42 @@ Question: {question}"""
             (formatted_context_string, citation_map)
         """
         citation_map = {}
-        context_parts = []
         
         for idx, chunk in enumerate(chunks, 1):
             metadata = chunk.get("metadata", {})
-            content = chunk.get("content", "")
-            
-            # Build source ID
-            fid = metadata.get("file_id", 0)
-            cid = metadata.get("sub_chunk_index", metadata.get("chunk_index", idx))
-            source_id = f"{fid}:{cid}"
-            
-            # Create citation object
-            citation = Citation(
-                source_id=source_id,
-                text=content,
+            sid = source_id(metadata, idx)
+            citation_map[sid] = Citation(
+                source_id=sid,
+                text=chunk.get("content", ""),
                 page=metadata.get("page", 1),
                 section=metadata.get("section", "General"),
-                file_id=fid,
+                file_id=metadata.get("file_id", 0),
                 score=chunk.get("score", 0.0)
             )
-            citation_map[source_id] = citation
-            
-            # Format for context
-            header = f"[Source ID: {source_id}] (Section: {citation.section})"
-            context_parts.append(f"{header}\n{content}\n")
         
-        return "\n---\n".join(context_parts), citation_map
+        return _format_context(chunks, meta_formatter=source_id_header), citation_map
     
-    def _call_llm(self, prompt: str, max_tokens: int) -> str:
+    async def _call_llm(self, prompt: str, max_tokens: int) -> str:
         """Call LLM API with error handling"""
         try:
-            response = requests.post(
-                self.api_url,
-                headers={
-                    "Authorization": f"Bearer {self.api_key}",
-                    "Content-Type": "application/json"
-                },
-                json={
-                    "model": self.model,
-                    "messages": [
-                        {
-                            "role": "system",
-                            "content": "You are a precise research assistant. Follow instructions exactly and cite all sources."
-                        },
-                        {
-                            "role": "user",
-                            "content": prompt
-                        }
-                    ],
-                    "temperature": 0.2,  # Low for precision
-                    "max_tokens": max_tokens
-                },
-                timeout=30
+            answer = await _chat_completion(
+                [
+                    {"role": "system", "content": PROMPTS["strict"]},
+                    {"role": "user", "content": prompt}
+                ],
+                temperature=0.2,  # Low for precision
+                top_p=1.0,
+                max_tokens=max_tokens,
+                api_key=self.api_key,
+                model=self.model
             )
-            response.raise_for_status()
-            result = response.json()
-            
-            if "choices" in result and len(result["choices"]) > 0:
-                return result["choices"][0]["message"]["content"]
-            
+        except Exception as e:
+            return groq_error_message(e)
+        
+        if answer is None:
             logger.error("No choices in LLM response")
             return "Error: Could not generate answer."
-            
-        except Exception as e:
-            logger.error(f"LLM API error: {e}")
-            return f"Error: {str(e)}"
+        return answer
     
     def _extract_formulas(self, text: str) -> List[str]:
         """Extract mathematical formulas from text"""
@@ -0,0 +1,125 @@
+"""
+Semantic Answer Cache
+~~~~~~~~~~~~~~~~~~~~~
+Serves a previous answer when a new question is a rephrasing of an old one
+over (nearly) the same retrieved chunks.
+
+Sits behind the exact-match cache in llm.py:
+- Query embeddings (normalized) live in one float32 matrix; lookup is a
+  single matrix-vector product, so it stays fast at a few thousand entries.
+- A hit needs cosine similarity >= sim_threshold AND Jaccard overlap of the
+  retrieved chunk ids >= overlap_threshold, so a similar question against
+  different documents never reuses an answer.
+- TTL expiry; expired rows are reused first, then the least-recently-used
+  slot is overwritten when full.
+"""
+
+import time
+import logging
+import threading
+from typing import List, Optional, Set
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+def _jaccard(a: Set[str], b: Set[str]) -> float:
+    if not a and not b:
+        return 1.0
+    return len(a & b) / len(a | b)
+
+
+class SemanticAnswerCache:
+    def __init__(
+        self,
+        max_entries: int = 10000,
+        sim_threshold: float = 0.97,
+        overlap_threshold: float = 0.8,
+        ttl: float = 3600
+    ):
+        self.max_entries = max_entries
+        self.sim_threshold = sim_threshold
+        self.overlap_threshold = overlap_threshold
+        self.ttl = ttl
+        self._lock = threading.Lock()
+
+        # Parallel storage; the matrix grows by doubling up to max_entries
+        self._vecs: Optional[np.ndarray] = None
+        self._n = 0
+        self._chunk_ids: List[Set[str]] = []
+        self._variants: List[str] = []
+        self._answers: List[str] = []
+        self._expires = np.zeros(0, dtype=np.float64)
+        self._last_used = np.zeros(0, dtype=np.float64)
+
+    @staticmethod
+    def _normalize(vec) -> np.ndarray:
+        v = np.asarray(vec, dtype=np.float32)
+        norm = np.linalg.norm(v)
+        return v / norm if norm else v
+
+    def lookup(self, query_vec, chunk_ids: Set[str], variant: str = "") -> Optional[str]:
+        """Return a cached answer for a near-identical query over overlapping chunks."""
+        q = self._normalize(query_vec)
+        now = time.time()
+        with self._lock:
+            if not self._n:
+                return None
+            sims = self._vecs[:self._n] @ q
+            # Live rows above the similarity threshold, most similar first; the
+            # best usable one wins, not just the argmax row
+            candidates = np.flatnonzero((sims >= self.sim_threshold) & (self._expires[:self._n] > now))
+            for i in candidates[np.argsort(-sims[candidates], kind="stable")]:
+                if self._variants[i] != variant:
+                    continue
+                if _jaccard(chunk_ids, self._chunk_ids[i]) < self.overlap_threshold:
+                    continue
+                self._last_used[i] = now
+                return self._answers[i]
+            return None
+
+    def add(self, query_vec, chunk_ids: Set[str], answer: str, variant: str = ""):
+        q = self._normalize(query_vec)
+        now = time.time()
+        with self._lock:
+            if self._vecs is None:
+                self._vecs = np.zeros((min(256, self.max_entries), q.shape[0]), dtype=np.float32)
+                self._expires = np.zeros(self._vecs.shape[0], dtype=np.float64)
+                self._last_used = np.zeros(self._vecs.shape[0], dtype=np.float64)
+
+            # Reclaim an expired row before growing or evicting a live one
+            expired = np.flatnonzero(self._expires[:self._n] <= now)
+            if expired.size:
+                slot = int(expired[0])
+                self._chunk_ids[slot] = chunk_ids
+                self._variants[slot] = variant
+                self._answers[slot] = answer
+            elif self._n < self.max_entries:
+                if self._n == self._vecs.shape[0]:
+                    cap = min(self._vecs.shape[0] * 2, self.max_entries)
+                    grown = np.zeros((cap, q.shape[0]), dtype=np.float32)
+                    grown[:self._n] = self._vecs
+                    self._vecs = grown
+                    pad = np.zeros(cap - self._n)
+                    self._expires = np.concatenate([self._expires, pad])
+                    self._last_used = np.concatenate([self._last_used, pad])
+                slot = self._n
+                self._n += 1
+                self._chunk_ids.append(chunk_ids)
+                self._variants.append(variant)
+                self._answers.append(answer)
+            else:
+                # Full: overwrite the least recently used entry
+                slot = int(np.argmin(self._last_used[:self._n]))
+                self._chunk_ids[slot] = chunk_ids
+                self._variants[slot] = variant
+                self._answers[slot] = answer
+
+            self._vecs[slot] = q
+            self._expires[slot] = now + self.ttl
+            self._last_used[slot] = now
+
+
+# Singleton
+semantic_cache = SemanticAnswerCache()
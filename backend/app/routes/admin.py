@@ -144,6 +144,7 @@ def get_all_chats(
 @router.delete("/users/{user_id}")
 def delete_user(user_id: int, db: Session = Depends(database.get_db), admin: models.User = Depends(auth.get_admin_user)):
     from ..storage.minio_client import minio_client
+    from ..rag import indexer
     
     user = db.query(models.User).filter(models.User.id == user_id).first()
     if not user:
@@ -162,6 +163,8 @@ def delete_user(user_id: int, db: Session = Depends(database.get_db), admin: mod
                     minio_client.delete_file(file.file_path)
             except Exception as e:
                 print(f"Warning: Could not delete file from MinIO: {file.file_path} - {e}")
+            # Delete indexed chunks and parent texts (logs, never raises)
+            indexer.delete_file_index(file.id)
             # Delete file record from DB
             db.delete(file)
             deleted_files_count += 1
@@ -5,6 +5,7 @@ from typing import List
 from .. import schemas, models, database, auth
 from ..storage.minio_client import minio_client
 from ..tasks.celery_app import process_file_task
+from ..rag import indexer
 import mimetypes
 
 router = APIRouter(
@@ -141,6 +142,9 @@ def delete_file(
         print(f"Warning: Failed to delete from MinIO: {e}")
         # Continue to delete from DB even if MinIO fails (orphaned check later?)
     
+    # Delete indexed chunks and parent texts (logs, never raises)
+    indexer.delete_file_index(file.id)
+    
     # Delete from DB
     db.delete(file)
     db.commit()
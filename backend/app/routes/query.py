@@ -1,4 +1,6 @@
 from fastapi import APIRouter, Depends, HTTPException
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 from typing import List, Dict, Any, Optional
 from sqlalchemy.orm import Session
@@ -6,7 +8,7 @@ import datetime
 import logging
 from .. import database, models, auth
 from ..rag import engine
-from ..rag.llm import generate_response
+from ..rag.llm import generate_response, stream_response
 
 logger = logging.getLogger(__name__)
 
@@ -36,7 +38,7 @@ class QueryResponse(BaseModel):
     metadata: Optional[Dict[str, Any]] = None
 
 @router.post("/query", response_model=QueryResponse)
-def query_documents(
+async def query_documents(
     request: QueryRequest,
     db: Session = Depends(database.get_db),
     current_user: models.User = Depends(auth.get_current_user)
@@ -64,9 +66,10 @@ def query_documents(
                     latency_ms=latency
                 )
         
-        # 1. Retrieve relevant chunks
+        # 1. Retrieve relevant chunks (CPU/blocking I/O; keep it off the event loop)
         t0 = time.time()
-        results = engine.query_documents(
+        results, query_embedding = await run_in_threadpool(
+            engine.query_documents_with_embedding,
             request.query, 
             user_id=current_user.id,
             file_ids=request.file_ids
@@ -74,36 +77,18 @@ def query_documents(
         t_retrieval = time.time() - t0
         
         citations = []
-        citation_map = {}
         
         if not results:
             answer = "I could not find any relevant information in your documents."
         else:
-            # Prepare Citation Map for Lookup
-            for i, doc in enumerate(results):
-                meta = doc.get("metadata", {})
-                fid = meta.get("file_id", 0)
-                # Try sub_chunk_index first, else chunk_index, else fallback
-                cid = meta.get("sub_chunk_index", meta.get("chunk_index", i+1))
-                source_id = f"{fid}:{cid}"
-                
-                c_obj = Citation(
-                    source_id=source_id,
-                    text=doc["content"],
-                    page=meta.get("page", meta.get("page_number", 1)),
-                    section=meta.get("section", "General"),
-                    file_id=fid,
-                    score=doc.get("score", 0.0)
-                )
-                citation_map[source_id] = c_obj
-                # Add to all candidates (we filter later or send all)
-                # For now, we'll send ALL retrieved as candidates, so UI can show "Sources Found"
-                # BUT the answer will only link to specific ones.
+            # We'll send ALL retrieved as candidates, so UI can show "Sources Found"
+            # BUT the answer will only link to specific ones.
+            citations = _build_citations(results)
             
             # 2. Generate answer (The formatting is handled in llm.py)
             t1 = time.time()
             # We pass the raw results, llm.generate_response handles the [Source ID] formatting/context
-            answer = generate_response(request.query, results)
+            answer = await generate_response(request.query, results, query_embedding=query_embedding)
             t_generation = time.time() - t1
             
             # 3. Parse Used Citations from Answer
@@ -115,8 +100,6 @@ def query_documents(
             # User wants "Evidence Schema".
             # Let's populate 'citations' with everything retrieved, but sorted by usage?
             # actually, let's just send everything retrieved so the UI has context.
-            # Convert map to list
-            citations = list(citation_map.values())
             
             # Optional: Start Log Verification
             # (Audit logic remains same)
@@ -129,7 +112,7 @@ def query_documents(
         metrics.log_query(total_time, success=bool(results), unsupported_claims=unsupported)
         
         # **SAVE CHAT TO DATABASE**
-        try:
+        def _save_chat():
             chat_entry = models.ChatHistory(
                 user_id=current_user.id,
                 query=request.query,
@@ -138,6 +121,9 @@ def query_documents(
             )
             db.add(chat_entry)
             db.commit()
+        
+        try:
+            await run_in_threadpool(_save_chat)
         except Exception as log_err:
             logger.error(f"Failed to log chat: {log_err}")
             # Don't fail the entire request if logging fails
@@ -160,6 +146,135 @@ def query_documents(
         metrics.log_query(time.time() - start_time, success=False, unsupported_claims=0)
         raise HTTPException(status_code=500, detail=f"Query failed: {str(e)}")
 
+def _build_citations(results: List[Dict]) -> List[Citation]:
+    """One Citation per source_id ("file_id:chunk"), for every retrieved chunk."""
+    citation_map = {}
+    for i, doc in enumerate(results):
+        meta = doc.get("metadata", {})
+        fid = meta.get("file_id", 0)
+        # Try sub_chunk_index first, else chunk_index, else fallback
+        cid = meta.get("sub_chunk_index", meta.get("chunk_index", i+1))
+        source_id = f"{fid}:{cid}"
+        
+        citation_map[source_id] = Citation(
+            source_id=source_id,
+            text=doc["content"],
+            page=meta.get("page", meta.get("page_number", 1)),
+            section=meta.get("section", "General"),
+            file_id=fid,
+            score=doc.get("score", 0.0)
+        )
+    return list(citation_map.values())
+
+def _sse(payload: Dict[str, Any]) -> bytes:
+    import orjson
+    return b"data: " + orjson.dumps(payload) + b"\n\n"
+
+@router.post("/query/stream")
+async def query_documents_stream(
+    request: QueryRequest,
+    current_user: models.User = Depends(auth.get_current_user)
+):
+    """
+    Streaming variant of /query (Server-Sent Events).
+    
+    Events: {"type": "delta", "text": ...} per generated chunk, then a final
+    {"type": "done", "citations": [...], "trace_id": ..., "latency_ms": ...}.
+    """
+    import time
+    import uuid
+    from ..rag.metrics import metrics
+    
+    from ..rag.conversational_handler import conversational_handler
+    
+    start_time = time.time()
+    trace_id = str(uuid.uuid4())
+    user_id = current_user.id
+    
+    # Conversational queries (greetings, help, etc.) skip retrieval, as in /query
+    if conversational_handler.is_conversational(request.query):
+        conversational_response = conversational_handler.get_response(request.query)
+        if conversational_response:
+            async def single_event():
+                yield _sse({"type": "delta", "text": conversational_response})
+                yield _sse({
+                    "type": "done",
+                    "citations": [],
+                    "trace_id": trace_id,
+                    "latency_ms": (time.time() - start_time) * 1000
+                })
+            return StreamingResponse(single_event(), media_type="text/event-stream")
+    
+    try:
+        results, query_embedding = await run_in_threadpool(
+            engine.query_documents_with_embedding,
+            request.query,
+            user_id=user_id,
+            file_ids=request.file_ids
+        )
+    except Exception as e:
+        # Log Failure (nothing streamed yet, so fail the request as /query does)
+        metrics.log_query(time.time() - start_time, success=False, unsupported_claims=0)
+        raise HTTPException(status_code=500, detail=f"Query failed: {str(e)}")
+    
+    citations = [c.dict() for c in _build_citations(results)]
+    
+    async def event_stream():
+        ttft = None
+        parts = []
+        success = bool(results)
+        failed = False
+        try:
+            if not results:
+                parts.append("I could not find any relevant information in your documents.")
+                yield _sse({"type": "delta", "text": parts[0]})
+            else:
+                async for delta in stream_response(request.query, results, query_embedding=query_embedding):
+                    if ttft is None:
+                        ttft = time.time() - start_time
+                    parts.append(delta)
+                    yield _sse({"type": "delta", "text": delta})
+            
+            total_time = time.time() - start_time
+            yield _sse({
+                "type": "done",
+                "citations": citations,
+                "trace_id": trace_id,
+                "latency_ms": total_time * 1000
+            })
+        except Exception as e:
+            success = False
+            failed = True
+            logger.error(f"Streaming query failed: {e}")
+            yield _sse({"type": "error", "error": f"Query failed: {str(e)}", "trace_id": trace_id})
+        
+        answer = "".join(parts)
+        unsupported = 1 if "not stated" in answer.lower() else 0
+        metrics.log_query(time.time() - start_time, success=success, unsupported_claims=unsupported, ttft_sec=ttft)
+        if failed:
+            return  # A cut-off answer isn't saved to history, as /query saves none on failure
+        
+        # Save chat once the full answer is known (request-scoped session is gone by now)
+        def _save_chat():
+            db = database.SessionLocal()
+            try:
+                db.add(models.ChatHistory(
+                    user_id=user_id,
+                    query=request.query,
+                    answer=answer,
+                    timestamp=datetime.datetime.now(datetime.timezone.utc)
+                ))
+                db.commit()
+            finally:
+                db.close()
+        
+        try:
+            await run_in_threadpool(_save_chat)
+        except Exception as log_err:
+            logger.error(f"Failed to log chat: {log_err}")
+    
+    return StreamingResponse(event_stream(), media_type="text/event-stream")
+
 class EvaluateRequest(BaseModel):
     question: str
     answer: str
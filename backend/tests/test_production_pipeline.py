@@ -0,0 +1,107 @@
+import random
+import re
+
+from app.rag.production_pipeline import (
+    DOC_PATTERNS,
+    DOC_TYPE_SAMPLE_CHARS,
+    INTENT_KEYWORDS,
+    INTENT_PATTERNS,
+    DocumentType,
+    UserIntent,
+    detect_document_type,
+    detect_intent,
+    route_query,
+)
+
+
+def _reference_document_type(filename: str, content: str) -> DocumentType:
+    """The original scorer: one re.findall per pattern, summed per type."""
+    text = f"{filename.lower()} {content.lower()}"
+    scores = {
+        doc_type: sum(len(re.findall(p, text, re.IGNORECASE | re.MULTILINE)) for p in patterns)
+        for doc_type, patterns in DOC_PATTERNS.items()
+    }
+    if scores[DocumentType.EXAM] >= 3:
+        return DocumentType.EXAM
+    max_type = max(scores, key=scores.get)
+    if scores[max_type] >= 2:
+        return max_type
+    return DocumentType.GENERAL
+
+
+PHRASES = [
+    "answer [5 marks]", "[5 marks]", "(3 marks)", "( 10 mark )", "Q1", "q. 2", "marks", "exam",
+    "CSE 2021", "B.Tech2020", "mid term", "end-term", "previous year", "write a function", "show that",
+    "abstract,", "introduction", "methodology", "conclusion", "we propose", "state-of-the-art",
+    "et al.", "arXiv", "F1 score", "hereby", "clause", "court", "shall", "must not",
+    "patient", "tablet", "mg", "X-ray", "CT scan", "ICU", "API", "json", "docker", "return",
+    "```python\n", "lecture", "theorem", "proof", "key points", "recap", "explain", "the", ".", "\n",
+]
+
+
+def test_document_type_overlapping_patterns_each_count():
+    """Overlapping spans (marks? inside [5 marks]) score once per pattern."""
+    assert detect_document_type("", "answer [5 marks]") == DocumentType.EXAM
+    assert detect_document_type("", "hereby tablet hereby [5 marks] theorem") == DocumentType.EXAM
+    assert detect_document_type(
+        "", "Q1 (5 marks) explain the abstract, introduction, methodology, conclusion"
+    ) == DocumentType.EXAM
+
+
+def test_document_type_filename_joins_content_with_space():
+    """Patterns may span the filename/content seam, as in the original."""
+    assert detect_document_type("mid", "term exam") == _reference_document_type("mid", "term exam")
+    assert detect_document_type("mid", "term exam") == DocumentType.EXAM
+
+
+def test_document_type_matches_reference_scorer():
+    """Compiled/gated scoring classifies like the original findall scorer."""
+    rng = random.Random(0)
+    for _ in range(5000):
+        filename = rng.choice(["exam.pdf", "Paper.PDF", "notes.txt", ""])
+        content = " ".join(rng.choice(PHRASES) for _ in range(rng.randint(0, 25)))
+        assert len(content) <= DOC_TYPE_SAMPLE_CHARS
+        assert detect_document_type(filename, content) == _reference_document_type(filename, content), content
+
+
+def _reference_intent(query: str) -> UserIntent:
+    """The original detect_intent: every pattern searched, in priority order."""
+    query_lower = query.lower().strip()
+    for intent, patterns in INTENT_PATTERNS.items():
+        if any(re.search(p, query_lower) for p in patterns):
+            return intent
+    return UserIntent.GENERAL
+
+
+def _reference_section_label(query: str) -> str:
+    """The original QueryOptimizer.classify_intent keyword buckets."""
+    q = query.lower()
+    for label, words in INTENT_KEYWORDS:
+        if any(w in q for w in words):
+            return label
+    return "GENERAL"
+
+
+QUERY_WORDS = [
+    "what", "is", "are", "this", "these", "tell", "me", "about", "the", "document", "summarize",
+    "give", "a", "summary", "explain", "how", "does", "why", "write", "code", "python", "derive",
+    "formula", "compare", "vs.", "better", "check", "is this correct", "list", "steps", "?",
+    "q1", "question 3", "main idea", "f1", "table", "limitation", "gap", "method", "training",
+    "What", "Tell", "  ",
+]
+
+
+def test_route_query_matches_reference_classifiers():
+    """route_query returns (old detect_intent, old classify_intent) for each query."""
+    rng = random.Random(1)
+    for _ in range(5000):
+        query = " ".join(rng.choice(QUERY_WORDS) for _ in range(rng.randint(1, 10)))
+        assert route_query(query) == (_reference_intent(query), _reference_section_label(query)), query
+        assert detect_intent(query) == _reference_intent(query)
+
+
+def test_route_query_what_is_this_fast_path():
+    """WHAT_IS_THIS prefixes win over later intents, as in the pattern list."""
+    assert route_query("What is this document about?")[0] == UserIntent.WHAT_IS_THIS
+    assert route_query("  tell me about the pdf")[0] == UserIntent.WHAT_IS_THIS
+    assert route_query("what is the main idea")[0] == UserIntent.ANSWER_QUESTION
@@ -0,0 +1,75 @@
+import numpy as np
+
+from app.rag import semantic_cache as semantic_cache_module
+from app.rag.semantic_cache import SemanticAnswerCache
+
+
+class _Clock:
+    def __init__(self, now: float = 1000.0):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def _cache(monkeypatch, **kwargs):
+    clock = _Clock()
+    monkeypatch.setattr(semantic_cache_module.time, "time", clock)
+    return SemanticAnswerCache(**kwargs), clock
+
+
+def _vec(*values):
+    return np.array(values, dtype=np.float32)
+
+
+def test_hit_on_similar_query_and_overlapping_chunks(monkeypatch):
+    """A near-identical query over the same chunks reuses the answer."""
+    cache, _ = _cache(monkeypatch)
+    cache.add(_vec(1, 0, 0), {"a", "b"}, "answer")
+    assert cache.lookup(_vec(1, 0.01, 0), {"a", "b"}) == "answer"
+
+
+def test_miss_on_dissimilar_query_or_different_chunks(monkeypatch):
+    """Low similarity or low chunk overlap is a miss."""
+    cache, _ = _cache(monkeypatch)
+    cache.add(_vec(1, 0, 0), {"a", "b"}, "answer")
+    assert cache.lookup(_vec(0, 1, 0), {"a", "b"}) is None
+    assert cache.lookup(_vec(1, 0, 0), {"c", "d"}) is None
+
+
+def test_expired_entries_miss(monkeypatch):
+    """Entries past their TTL are never served."""
+    cache, clock = _cache(monkeypatch, ttl=10)
+    cache.add(_vec(1, 0, 0), {"a"}, "answer")
+    clock.now += 11
+    assert cache.lookup(_vec(1, 0, 0), {"a"}) is None
+
+
+def test_variants_are_isolated(monkeypatch):
+    """An answer cached for one prompt variant is not served to another."""
+    cache, _ = _cache(monkeypatch)
+    cache.add(_vec(1, 0, 0), {"a"}, "plain", variant="plain|")
+    cache.add(_vec(1, 0, 0), {"a"}, "exam", variant="exam|")
+    assert cache.lookup(_vec(1, 0, 0), {"a"}, variant="plain|") == "plain"
+    assert cache.lookup(_vec(1, 0, 0), {"a"}, variant="exam|") == "exam"
+    assert cache.lookup(_vec(1, 0, 0), {"a"}, variant="other|") is None
+
+
+def test_best_row_unusable_falls_back_to_next_candidate(monkeypatch):
+    """An expired or mismatched top match doesn't hide a valid runner-up."""
+    cache, clock = _cache(monkeypatch, ttl=10)
+    cache.add(_vec(1, 0, 0), {"a"}, "stale")
+    clock.now += 5
+    cache.add(_vec(1, 0.05, 0), {"a"}, "fresh")
+    clock.now += 6
+    assert cache.lookup(_vec(1, 0, 0), {"a"}) == "fresh"
+
+
+def test_expired_rows_are_reused_on_insert(monkeypatch):
+    """Inserting after expiry overwrites the dead row instead of growing."""
+    cache, clock = _cache(monkeypatch, ttl=10)
+    cache.add(_vec(1, 0, 0), {"a"}, "old")
+    clock.now += 11
+    cache.add(_vec(0, 1, 0), {"b"}, "new")
+    assert cache._n == 1
+    assert cache.lookup(_vec(0, 1, 0), {"b"}) == "new"
@@ -0,0 +1,106 @@
+import random
+
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+from app.rag.parsers.text_splitter import SplitMergeChunker
+
+SEPARATORS = ["\n\n", "\n", ". ", " ", ""]
+WORDS = ["alpha", "beta", "gamma", "delta", "epsilon", "zeta", "eta", "theta"]
+
+
+def _recursive(chunk_size: int, chunk_overlap: int) -> RecursiveCharacterTextSplitter:
+    """The splitter SplitMergeChunker replaced, as page_aware_parser configured it."""
+    return RecursiveCharacterTextSplitter(
+        chunk_size=chunk_size, chunk_overlap=chunk_overlap, separators=SEPARATORS
+    )
+
+
+def _recursive_spans(text: str, chunk_size: int, chunk_overlap: int):
+    """Recursive's chunks as (chunk_text, start_char, end_char), like SplitMergeChunker.chunks."""
+    splitter = RecursiveCharacterTextSplitter(
+        chunk_size=chunk_size, chunk_overlap=chunk_overlap, separators=SEPARATORS, add_start_index=True
+    )
+    return [
+        (d.page_content, d.metadata["start_index"], d.metadata["start_index"] + len(d.page_content))
+        for d in splitter.create_documents([text])
+    ]
+
+
+def test_short_text_matches_recursive():
+    """Text within chunk_size comes back as one stripped chunk (or none)."""
+    for text in ["", "   \n", "  short text \n", "a. b c\n\nd"]:
+        assert SplitMergeChunker(200, 20).split_text(text) == _recursive(200, 20).split_text(text)
+
+
+def test_hard_split_matches_recursive():
+    """Without separators both fall back to fixed-size character splits."""
+    text = "x" * 500
+    assert SplitMergeChunker(200, 0).split_text(text) == _recursive(200, 0).split_text(text)
+
+
+def test_paragraph_boundaries_match_recursive():
+    """Paragraphs pack greedily up to chunk_size, as Recursive packs them."""
+    text = "\n\n".join(["a" * 53, "b" * 60, "c" * 71, "d" * 64])
+    assert SplitMergeChunker(200, 0).split_text(text) == _recursive(200, 0).split_text(text)
+
+
+def test_paragraph_ending_at_limit_stays_in_chunk():
+    """A paragraph ending exactly at chunk_size isn't pushed out by its trailing separator."""
+    text = "\n\n".join(["b" * 60, "c" * 71, "d" * 64, "e" * 10])
+    chunks = SplitMergeChunker(199, 0).split_text(text)
+    assert chunks == _recursive(199, 0).split_text(text)
+    assert [len(c) for c in chunks] == [199, 10]
+
+
+def test_whole_units_and_no_more_chunks_than_recursive():
+    """Paragraph and word documents cut only between units, never into more chunks."""
+    rng = random.Random(0)
+    for _ in range(500):
+        size = rng.choice([200, 400, 1000])
+        units = [
+            " ".join(rng.choice(WORDS) for _ in range(rng.randint(size // 30, size // 12)))
+            for _ in range(rng.randint(1, 40))
+        ]
+        for sep in ("\n\n", " "):
+            text = sep.join(units)
+            ours = SplitMergeChunker(size, 0).split_text(text)
+            assert sep.join(ours) == text
+            assert all(len(c) <= size for c in ours)
+            assert len(ours) <= len(_recursive(size, 0).split_text(text))
+
+
+def test_overlap_bounded_and_word_aligned_like_recursive():
+    """Consecutive chunks share at most chunk_overlap chars, starting on a word."""
+    rng = random.Random(1)
+    for _ in range(200):
+        text = " ".join(rng.choice(WORDS) for _ in range(rng.randint(50, 300)))
+        for chunks in (SplitMergeChunker(200, 50).chunks(text), _recursive_spans(text, 200, 50)):
+            assert chunks[0][1] == 0 and chunks[-1][2] == len(text)
+            for (_, _, e1), (_, s2, _) in zip(chunks, chunks[1:]):
+                # Overlapping, or adjacent across one space: nothing dropped
+                assert -1 <= e1 - s2 <= 50
+                assert text[s2 - 1] == " "
+
+
+def test_chunk_offsets_and_invariants():
+    """Offsets are exact, spans advance, and every non-space char is covered."""
+    rng = random.Random(2)
+    pieces = WORDS + [" ", "  ", "\n", "\n\n", ". ", " " * 60]
+    for _ in range(2000):
+        size = rng.choice([20, 50, 200, 400])
+        chunker = SplitMergeChunker(size, rng.choice([0, 10, 50, 200]))
+        text = "".join(rng.choice(pieces) for _ in range(rng.randint(0, 400)))
+        chunks = chunker.chunks(text)
+
+        covered = set()
+        for chunk, start, end in chunks:
+            assert chunk and chunk == chunk.strip() and len(chunk) <= size
+            assert text[start:end] == chunk
+            covered.update(range(start, end))
+        assert all(i in covered for i, ch in enumerate(text) if not ch.isspace())
+
+        # Each chunk starts and ends past the previous one (no repeats or
+        # nested chunks), and re-reads at most chunk_overlap chars of it
+        for (_, s1, e1), (_, s2, e2) in zip(chunks, chunks[1:]):
+            assert s1 < s2 and e1 < e2
+            assert e1 - s2 <= chunker.chunk_overlap